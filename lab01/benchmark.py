@@ -0,0 +1,260 @@
+import argparse
+import contextlib
+from functools import partial
+import json
+from math import comb
+import os
+import time
+import tracemalloc
+
+from monkey_banana.agents import RandomAgent, RuleBasedAgent, PlanningAgent
+from monkey_banana.banana_environment import MonkeyBananaFOEnvironmentTask
+from monkey_banana.grid_environment import GridMonkeyBananaEnvironmentTask
+
+
+# Agents to benchmark, built from the max_search_depth. The planning agents are
+# run for every max_search_depth.
+
+AGENTS = {
+    "random":          lambda depth: RandomAgent(),
+    "rule_based":      lambda depth: RuleBasedAgent(),
+    "planning":        lambda depth: PlanningAgent(max_search_depth=depth),
+    "planning_tt":     lambda depth: PlanningAgent(use_transposition_table=True, max_search_depth=depth),
+    "planning_cached": lambda depth: PlanningAgent(use_transposition_table=True, cache_plan=True,
+                                                   max_search_depth=depth),
+}
+
+PLANNING_AGENTS = {"planning", "planning_tt", "planning_cached"}
+
+# Agents run in the grid environment. The rule based agent only knows the 1-D
+# room, and the plain tree search, which expands again the states reached
+# along different paths, does not finish in a 2-D room at the usual depths.
+GRID_AGENTS = {"random", "planning_tt", "planning_cached"}
+
+
+
+def grid_environment(grid_size: int, n_boxes: int):
+    """
+    Square room of grid_size cells per side, with the monkey in a corner, the
+    banana in the opposite one, an orange in a third one and n_boxes boxes in
+    a row across the middle of the room.
+    """
+    return GridMonkeyBananaEnvironmentTask(grid_size, grid_size, (0, 0),
+                                           [(i + 1, grid_size // 2) for i in range(n_boxes)],
+                                           [(grid_size - 1, grid_size - 1)], [(0, grid_size - 1)])
+
+
+
+def grid_state_space(grid_size: int, n_boxes: int):
+    """
+    Number of states of grid_environment with the fruits in place: position
+    and height of the monkey, and positions of the boxes.
+    """
+    n_cells = grid_size * grid_size
+    return 2 * n_cells * comb(n_cells, n_boxes)
+
+
+
+def run_episode(agent_name: str, make_environment, max_search_depth: int, max_steps: int):
+    """
+    Runs one episode of the given agent in a new environment returned by
+    make_environment.
+
+    Returns
+    -------
+    steps : int
+        Number of decisions taken by the agent.
+    score : float
+        Final score.
+
+    """
+    environment = make_environment()
+    agent = AGENTS[agent_name](max_search_depth)
+
+    steps = 0
+    done = False
+    while not done and steps < max_steps:
+        action = agent.choose_action(environment)
+        done = environment.perform_action(action)
+        steps += 1
+
+    return steps, environment.score
+
+
+
+def benchmark_case(agent_name: str, make_environment, case: dict, max_search_depth: int, n_episodes: int,
+                   max_steps: int):
+    """
+    Runs n_episodes of the given agent in environments returned by
+    make_environment and measures their speed. The peak memory is measured on
+    a separate episode, since tracemalloc slows down the execution.
+
+    Returns
+    -------
+    result : dict
+        Parameters of the case (case, the agent and the search depth) and
+        measures.
+
+    """
+    # The tree search prints the actions of the plans it finds
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        total_steps = 0
+        start = time.perf_counter()
+        for _ in range(n_episodes):
+            steps, _ = run_episode(agent_name, make_environment, max_search_depth, max_steps)
+            total_steps += steps
+        elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        run_episode(agent_name, make_environment, max_search_depth, max_steps)
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "agent": agent_name,
+        **case,
+        "max_search_depth": max_search_depth,
+        "episodes": n_episodes,
+        "episodes_per_sec": n_episodes / elapsed,
+        "decisions_per_sec": total_steps / elapsed,
+        "peak_memory_bytes": peak_memory,
+        "mean_steps": total_steps / n_episodes,
+    }
+
+
+
+def print_result(result: dict, description: str):
+    print(f"{result['agent']:16} {description} depth {str(result['max_search_depth']):4} | "
+          f"{result['episodes_per_sec']:10.1f} episodes/s "
+          f"{result['decisions_per_sec']:12.1f} decisions/s "
+          f"{result['peak_memory_bytes'] / 1024:10.1f} KiB "
+          f"{result['mean_steps']:8.1f} steps")
+
+
+
+def run_benchmarks(agent_names: list, room_sizes: list, max_search_depths: list, n_episodes: int, max_steps: int,
+                   grid_sizes: list = (), n_grid_boxes: int = 4):
+    """
+    Runs every agent over a grid of room sizes, banana and box positions (both
+    ends and the middle of the room) and search depths, then the agents of
+    GRID_AGENTS in the grid environments of the given grid_sizes (see
+    grid_environment), whose state spaces are far larger.
+
+    Returns
+    -------
+    results : list
+        One dict per case, see benchmark_case.
+
+    """
+    results = []
+    for agent_name in agent_names:
+        depths = max_search_depths if agent_name in PLANNING_AGENTS else [None]
+        for room_size in room_sizes:
+            positions = sorted({0, room_size // 2, room_size - 1})
+            for banana_position in positions:
+                for box_position in positions:
+                    for max_search_depth in depths:
+                        case = {"environment": "line", "room_size": room_size,
+                                "banana_position": banana_position, "box_position": box_position}
+                        make_environment = partial(MonkeyBananaFOEnvironmentTask, banana_position, box_position,
+                                                   room_size)
+                        result = benchmark_case(agent_name, make_environment, case, max_search_depth,
+                                                n_episodes, max_steps)
+                        results.append(result)
+                        print_result(result, f"room {room_size:4} banana {banana_position:4} box {box_position:4}")
+
+        if agent_name not in GRID_AGENTS:
+            continue
+        for grid_size in grid_sizes:
+            for max_search_depth in depths:
+                case = {"environment": "grid", "room_size": grid_size, "boxes": n_grid_boxes,
+                        "state_space": grid_state_space(grid_size, n_grid_boxes)}
+                make_environment = partial(grid_environment, grid_size, n_grid_boxes)
+                result = benchmark_case(agent_name, make_environment, case, max_search_depth, n_episodes, max_steps)
+                results.append(result)
+                print_result(result, f"grid {grid_size:2}x{grid_size:<2} {n_grid_boxes:2} boxes "
+                                     f"{result['state_space']:.1e} states")
+    return results
+
+
+
+def case_key(result: dict):
+    # The results of the runs before the grid cases are all in the line
+    return (result["agent"], result.get("environment", "line"), result["room_size"], result.get("banana_position"),
+            result.get("box_position"), result.get("boxes"), result["max_search_depth"])
+
+
+
+def compare_with_baseline(results: list, baseline: list, tolerance: float = 0.2, memory_floor: int = 4096):
+    """
+    Compares the results with the ones of a baseline run.
+
+    Parameters
+    ----------
+    results : list
+        Results of run_benchmarks.
+    baseline : list
+        Results of a previous run.
+    tolerance : float, optional
+        Relative slowdown of the decisions per second, or relative increase of
+        the peak memory, above which a case is reported. The default is 0.2.
+    memory_floor : int, optional
+        Increase of the peak memory, in bytes, below which it is not reported
+        whatever its relative size, since the peaks of single episodes are a
+        few hundred bytes and vary from run to run. The default is 4096.
+
+    Returns
+    -------
+    regressions : list
+        (result, baseline result) of the cases which regressed.
+
+    """
+    baseline_results = {case_key(result): result for result in baseline}
+    regressions = []
+
+    for result in results:
+        reference = baseline_results.get(case_key(result))
+        if reference is None:
+            continue
+        slower = result["decisions_per_sec"] < reference["decisions_per_sec"] * (1 - tolerance)
+        increase = result["peak_memory_bytes"] - reference["peak_memory_bytes"]
+        heavier = increase > max(reference["peak_memory_bytes"] * tolerance, memory_floor)
+        if slower or heavier:
+            regressions.append((result, reference))
+
+    return regressions
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the monkey and banana agents")
+    parser.add_argument("--agents", nargs="+", default=list(AGENTS), choices=list(AGENTS))
+    parser.add_argument("--room-sizes", nargs="+", type=int, default=[5, 10])
+    parser.add_argument("--depths", nargs="+", type=int, default=[4, 8])
+    parser.add_argument("--grid-sizes", nargs="+", type=int, default=[6])
+    parser.add_argument("--grid-boxes", type=int, default=4)
+    parser.add_argument("--episodes", type=int, default=20)
+    parser.add_argument("--max-steps", type=int, default=10000)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--memory-floor", type=int, default=4096)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.agents, args.room_sizes, args.depths, args.episodes, args.max_steps,
+                             args.grid_sizes, args.grid_boxes)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        regressions = compare_with_baseline(results, baseline, args.tolerance, args.memory_floor)
+        print(f"{len(regressions)} regression(s) compared to {args.baseline}")
+        for result, reference in regressions:
+            print(f"  {case_key(result)}: "
+                  f"{reference['decisions_per_sec']:.1f} -> {result['decisions_per_sec']:.1f} decisions/s, "
+                  f"{reference['peak_memory_bytes']} -> {result['peak_memory_bytes']} bytes")
@@ -0,0 +1 @@
+# Makes the monkey_banana package importable from the tests
@@ -1,7 +1,14 @@
+from functools import partial
+
 from monkey_banana.agents import RandomAgent, RuleBasedAgent, PlanningAgent
 from monkey_banana.banana_environment import MonkeyBananaEnvironmentTask
 from monkey_banana.banana_environment import MonkeyBananaFOEnvironmentTask, MonkeyBananaPOEnvironmentTask
 from monkey_banana.banana_environment import MonkeyBananaAction
+from monkey_banana.runner import run_episodes
+from monkey_banana.statistics import EpisodeStatistics
+from monkey_banana.markov_analysis import random_agent_expectations, optimal_run_probability
+
+import numpy as np
 
 import plotly.express as px
 
@@ -46,33 +53,37 @@ if __name__ == "__main__":
     # question10()
     if False:
         print("\n\nRandom agent:\n")
-        agents_with_optimal_solution = 0
         executions = 10000
-        steps_needed = 0
-        steps_needed_list = [0] * executions
-        score_list = [0] * executions
-
-        for i in range(executions):
-            steps_needed = 0
-            environment = MonkeyBananaFOEnvironmentTask(initial_banana_position, initial_box_position, room_size)
-            agent = RandomAgent()
-            action = agent.choose_action(environment)
-            steps_needed += 1
-            
-            while not environment.perform_action(action):
-                action = agent.choose_action(environment)
-                steps_needed += 1
 
-            score_list[i] = environment.score
-            if environment.score == 4.4:
-                agents_with_optimal_solution += 1
-            steps_needed_list[i] = steps_needed
-
-        print(f"Average score: {sum(score_list)/executions}")
-        print(f"Average steps needed: {sum(steps_needed_list)/executions}")
-        print(f"Agents with optimal solution: {agents_with_optimal_solution}\n")
-
-        fig = px.histogram(x=steps_needed_list, title="Score distribution", labels={"x": "Steps needed"}, nbins=1000)
+        # Episodes are spread over all the cores by chunks of 1000, each with
+        # its own generator spawned from the seed, and only their statistics
+        # are kept, so the study gives the same answer on every run
+        statistics = run_episodes(partial(MonkeyBananaFOEnvironmentTask, initial_banana_position,
+                                          initial_box_position, room_size),
+                                  RandomAgent, executions, seed=2024, chunk_size=1000,
+                                  statistics_factory=partial(EpisodeStatistics, optimal_score=4.4))
+
+        print(f"Average score: {statistics.scores.mean}")
+        print(f"Average steps needed: {statistics.steps.mean}")
+        print(f"Median steps needed: {statistics.steps_sketch.quantile(0.5)}")
+        print(f"Agents with optimal solution: {statistics.optimal}\n")
+
+        # Exact values from the absorbing Markov chain of the random agent
+        expected_steps, std_steps, expected_scores = random_agent_expectations(room_size)
+        initial_state = (initial_box_position, initial_banana_position, 0)
+        print(f"Exact average score: {expected_scores[initial_state]}")
+        print(f"Exact average steps needed: {expected_steps[initial_state]} (std {std_steps[initial_state]})")
+        print(f"Exact probability of an optimal solution: "
+              f"{optimal_run_probability(room_size, initial_banana_position, initial_box_position)}\n")
+
+        # The episodes longer than the histogram are shown as a last bar
+        histogram = statistics.steps_histogram
+        print(f"Episodes of {histogram.high} steps or more: {histogram.overflow} "
+              f"(up to {statistics.steps.max:.0f} steps)\n")
+        fig = px.bar(x=np.append(histogram.bin_edges[:-1], histogram.high),
+                     y=np.append(histogram.counts, histogram.overflow),
+                     title=f"Steps distribution (last bar: {histogram.high} steps or more)",
+                     labels={"x": "Steps needed", "y": "count"})
         fig.show()
 
 
@@ -101,9 +112,8 @@ if __name__ == "__main__":
         environment = MonkeyBananaFOEnvironmentTask(initial_banana_position, initial_box_position, room_size)
         
         steps_needed = 0
-        agent = PlanningAgent()
-        max_search_depth = 8
-        action = agent.choose_action(environment, max_search_depth)
+        agent = PlanningAgent(cache_plan=True, max_search_depth=8)
+        action = agent.choose_action(environment)
         print(action)
         environment.visualize()
         steps_needed += 1
@@ -111,11 +121,12 @@ if __name__ == "__main__":
         while not environment.perform_action(action):
             environment.visualize()
             print(action)
-            action = agent.choose_action(environment, max_search_depth)
+            action = agent.choose_action(environment)
             steps_needed += 1
 
         print(f"Score: {environment.score}")
-        print(f"Steps needed: {steps_needed}\n")
+        print(f"Steps needed: {steps_needed}")
+        print(f"Plan cache hits / misses: {agent.plan_hits} / {agent.plan_misses}\n")
 
 
 
@@ -1,5 +1,5 @@
+import math
 from random import sample
-from copy import deepcopy
 import numpy as np
 
 from  . banana_environment import MonkeyBananaEnvironmentTask
@@ -7,6 +7,12 @@ from  . banana_environment import MonkeyBananaFOEnvironmentTask, MonkeyBananaPOE
 from . banana_environment import MonkeyBananaAction
 from . banana_environment import MonkeyBananaPartialObservation
 from . banana_environment import MonkeyBananaState
+from . banana_environment import ACTION_PENALTY, GRAB_BANANA_REWARD
+from . value_iteration import load_policy_table
+from . belief import smell_likelihood_table, update_beliefs, update_particles, reweight_particles, particle_beliefs
+from . pomdp import PointBasedPolicy, point_based_value_iteration
+from . rendering import Renderer
+from . trajectory import TrajectoryRecorder
 
 
 
@@ -15,6 +21,20 @@ class Agent:
     General abstract class for an agent.
     """
     
+    # Random generator used by the agent. The default (None) is to use the
+    # global generator of the random module.
+    rng: np.random.Generator = None
+    
+    
+    def _sample_action(self, available_actions: list):
+        """
+        Draws one of the given actions uniformly at random.
+        """
+        if self.rng is None:
+            return sample(available_actions, 1)[0]
+        return available_actions[self.rng.integers(len(available_actions))]
+    
+    
     def choose_action(self, env: MonkeyBananaEnvironmentTask, verbose:str = True):
         """
         (Abstract) Implements the choice of action for the specific agent. 
@@ -36,7 +56,8 @@ class Agent:
     
     
     
-    def run(self, env: MonkeyBananaEnvironmentTask, n_steps : int, verbose: str = True):
+    def run(self, env: MonkeyBananaEnvironmentTask, n_steps : int, verbose: str = True, renderer: Renderer = None,
+            recorder: TrajectoryRecorder = None):
         """
         Runs the agent for a sequence of several steps
 
@@ -48,6 +69,12 @@ class Agent:
             Maximal number of steps to run the agent.
         verbose : str, optional
             Allow logs. The default is True.
+        renderer : Renderer, optional
+            Renderer of the frames and logs, e.g. a HeadlessRenderer, a
+            BufferedRenderer or a FrameRecorder. The default is to print them.
+        recorder : TrajectoryRecorder, optional
+            Records the transitions of the run as a new episode. The default
+            is not to record them.
 
         Returns
         -------
@@ -55,19 +82,26 @@ class Agent:
             Final environment.
 
         """
-        if verbose: env.visualize()
+        log = print if renderer is None else renderer.write
+        
+        if verbose: env.visualize(renderer)
+        if recorder is not None: recorder.start_episode()
         
         for n in range(n_steps):
-            if verbose: print("\n======= Step", n)
+            if verbose: log("\n======= Step", n)
             action = self.choose_action(env, verbose)     
-            if verbose: print("\nAction:", action, "\n")
+            if verbose: log("\nAction:", action, "\n")
             
+            state = env.state
             res = env.perform_action(action)
+            if recorder is not None: recorder.record(state, action, env.last_reward)
             if res:
-                print("Victory!")
-                print("Total score:", env.performance())
+                log("Victory!")
+                log("Total score:", env.performance())
                 break
-            if verbose: env.visualize()
+            if verbose: env.visualize(renderer)
+        
+        if renderer is not None: renderer.flush()
             
         return env
 
@@ -80,9 +114,9 @@ class RandomAgent(Agent):
     Random agent (Section 3)
     """
     
-    def choose_action(self, env: MonkeyBananaEnvironmentTask):
+    def choose_action(self, env: MonkeyBananaEnvironmentTask, verbose: bool = False):
         available_actions = env.available_actions()
-        action = sample(available_actions, 1)[0]
+        action = self._sample_action(available_actions)
         return action
         
     
@@ -94,7 +128,7 @@ class RuleBasedAgent(Agent):
     Reflex rule-based agent (Section 4)
     """
     
-    def choose_action(self, env: MonkeyBananaFOEnvironmentTask):
+    def choose_action(self, env: MonkeyBananaFOEnvironmentTask, verbose: bool = False):
         
         observation = env.perceive()
 
@@ -114,6 +148,32 @@ class PlanningAgent(Agent):
     Planning agent (Section 5)
     """
     
+    def __init__(self, use_transposition_table: bool = False, cache_plan: bool = False, max_search_depth: int = None):
+        """
+        Parameters
+        ----------
+        use_transposition_table : bool, optional
+            Plan with a breadth-first search over the states of the environment
+            sharing a single table of visited states, instead of the recursive
+            tree search. The default is False.
+        cache_plan : bool, optional
+            Keep the whole plan found by the search and replay it in the next
+            steps as long as the observed states match the predicted ones.
+            The default is False.
+        max_search_depth : int, optional
+            Maximal length of the plans. The default is no limit.
+
+        """
+        self.use_transposition_table = use_transposition_table
+        self.cache_plan = cache_plan
+        self.max_search_depth = max_search_depth
+        
+        # Cached plan as a list of (expected state, action), next step last
+        self.plan_cache = []
+        self.plan_hits = 0
+        self.plan_misses = 0
+    
+    
     def _launch_planning(self, env: MonkeyBananaFOEnvironmentTask, max_search_depth: int):
         """
         Method used to launch the planning. To be used only withing choose_action
@@ -127,10 +187,16 @@ class PlanningAgent(Agent):
         -------
         plan_found: bool
             Shows whether the planning was succesful.
-        action: MonkeyBananaAction
-            Returns the optimal action
+        plan: list
+            Sequence of MonkeyBananaAction leading to victory.
 
         """
+        if self.use_transposition_table:
+            return self._plan_with_transposition_table(env, max_search_depth)
+        
+        if max_search_depth is None:
+            max_search_depth = math.inf
+        
         encountered_states = set()
         return self._plan(env, encountered_states, max_search_depth)
         
@@ -145,78 +211,294 @@ class PlanningAgent(Agent):
         env : MonkeyBananaFOEnvironmentTask
             Environment.
         encountered_states : set
-            States that have already been explored by the search.
+            States on the path currently explored by the search.
 
         Returns
         -------
         plan_found: bool
             Shows whether the planning was succesful.
-        action: MonkeyBananaAction
-            Returns the optimal action.
+        plan: list
+            Sequence of MonkeyBananaAction leading to victory.
 
         """
 
         if max_search_depth == 0:
-            return False, None
+            return False, []
         
         perceived_state_representation = env.perceive().vector_representation()
         
-        encountered_states.add(perceived_state_representation)
-        
         if perceived_state_representation in encountered_states:
-            return False, None
+            return False, []
+        
+        encountered_states.add(perceived_state_representation)
         
         available_actions = env.available_actions()
         
         for action in available_actions:
-            # Makes a copy of the environment => This copy is used to then execute
-            # the planning recursively from the new state reached after playing
-            # the explored action
-            env_copy = deepcopy(env)
-            
-            # Execute the action within the copied environment. 
-            victory = env_copy.perform_action(action)
+            # Execute the action within the environment, the planning is then
+            # executed recursively from the new state reached after playing
+            # the explored action, and the action is undone afterwards
+            victory, undo = self._apply(env, action)
             
             if victory:
                 # This action led to victory => planning is over!
+                self._undo(env, undo)
                 print(action)
-                return True, action
-            
-            new_state = env_copy.perceive().vector_representation()
-            
-            encountered_states_copy = deepcopy(encountered_states)
-            encountered_states_copy.add(new_state)
+                return True, [action]
 
             # Execute the search recursively from the new state
-            plan_found, _ = self._plan(env_copy, encountered_states_copy, max_search_depth - 1)
+            plan_found, plan = self._plan(env, encountered_states, max_search_depth - 1)
+            self._undo(env, undo)
                 
             if plan_found: 
                 print(action)
-                return True, action
+                return True, [action] + plan
+        
+        # Only the states on the current path are kept in encountered_states
+        encountered_states.discard(perceived_state_representation)
+        return False, []
+    
+    
+    def _apply(self, env: MonkeyBananaFOEnvironmentTask, action: MonkeyBananaAction):
+        """
+        Performs an action in the environment and remembers how to revert it.
+
+        Parameters
+        ----------
+        env : MonkeyBananaFOEnvironmentTask
+            Environment.
+        action : MonkeyBananaAction
+            Action to perform.
+
+        Returns
+        -------
+        victory: bool
+            Whether the action led to victory.
+        undo: tuple
+            Information needed by _undo to revert the action.
+
+        """
+        undo = env.snapshot()
+        victory = env.perform_action(action)
+        return victory, undo
+    
+    
+    def _undo(self, env: MonkeyBananaFOEnvironmentTask, undo: tuple):
+        """
+        Reverts an action performed with _apply.
+
+        Parameters
+        ----------
+        env : MonkeyBananaFOEnvironmentTask
+            Environment.
+        undo : tuple
+            Information returned by _apply.
+
+        """
+        env.restore(undo)
+    
+    
+    def _plan_with_transposition_table(self, env: MonkeyBananaFOEnvironmentTask, max_search_depth: int = None):
+        """
+        Private method used to execute the planning as a breadth-first search
+        over the state representations. Each reachable state is expanded at
+        most once, and the successors are computed by applying and undoing the
+        actions in the environment itself instead of copying it.
+
+        Parameters
+        ----------
+        env : MonkeyBananaFOEnvironmentTask
+            Environment in the initial state.
+        max_search_depth : int, optional
+            Maximal length of the plan. The default is no limit.
+
+        Returns
+        -------
+        plan_found: bool
+            Shows whether the planning was succesful.
+        plan: list
+            Shortest sequence of MonkeyBananaAction leading to victory.
+
+        """
+        initial = env.snapshot()
+        initial_state = env.perceive().vector_representation()
+        
+        # Transposition table: state => (previous state, action leading to it)
+        parents = {initial_state: None}
+        frontier = [(initial_state, initial)]
+        depth = 0
+        
+        while frontier and (max_search_depth is None or depth < max_search_depth):
+            next_frontier = []
+            
+            for state, token in frontier:
+                self._undo(env, token)
+                
+                for action in env.available_actions():
+                    victory, undo = self._apply(env, action)
+                    new_state = env.perceive().vector_representation()
+                    new_token = env.snapshot()
+                    self._undo(env, undo)
+                    
+                    if victory:
+                        plan = [action]
+                        while parents[state] is not None:
+                            state, previous_action = parents[state]
+                            plan.append(previous_action)
+                        self._undo(env, initial)
+                        return True, plan[::-1]
+                    
+                    if new_state not in parents:
+                        parents[new_state] = (state, action)
+                        next_frontier.append((new_state, new_token))
+            
+            frontier = next_frontier
+            depth += 1
+        
+        self._undo(env, initial)
+        return False, []
+    
+    
+    def _predict_states(self, env: MonkeyBananaFOEnvironmentTask, plan: list):
+        """
+        Computes the states in which each action of the plan will be performed.
+
+        Parameters
+        ----------
+        env : MonkeyBananaFOEnvironmentTask
+            Environment in the initial state.
+        plan : list
+            Sequence of MonkeyBananaAction.
+
+        Returns
+        -------
+        states: list
+            Representation of the state before each action of the plan.
+
+        """
+        states = []
+        undos = []
+        for action in plan:
+            states.append(env.perceive().vector_representation())
+            _, undo = self._apply(env, action)
+            undos.append(undo)
         
-        return False, None
+        for undo in reversed(undos):
+            self._undo(env, undo)
+        
+        return states
     
     
-    def choose_action(self, env: MonkeyBananaFOEnvironmentTask, max_search_depth: int):
-        plan_found, action = self._launch_planning(env, max_search_depth)
+    def choose_action(self, env: MonkeyBananaFOEnvironmentTask, verbose: bool = False):
+        if self.plan_cache:
+            expected_state, action = self.plan_cache.pop()
+            if env.perceive().vector_representation() == expected_state:
+                self.plan_hits += 1
+                return action
+            
+            # The environment diverged from the plan => replan
+            self.plan_cache = []
+        
+        self.plan_misses += 1
+        plan_found, plan = self._launch_planning(env, self.max_search_depth)
         
         if plan_found:
-            return action
+            if self.cache_plan:
+                states = self._predict_states(env, plan)
+                self.plan_cache = list(zip(states[:0:-1], plan[:0:-1]))
+            return plan[0]
         else:
             available_actions = env.available_actions()
-            action = sample(available_actions, 1)[0]
+            action = self._sample_action(available_actions)
             return action
 
 
 
+class PolicyTableAgent(Agent):
+    """
+    Agent following the optimal policy precomputed for every state by value
+    iteration, see value_iteration.py
+    """
+    
+    def __init__(self, room_size: int, action_penalty: float = ACTION_PENALTY, grab_reward: float = GRAB_BANANA_REWARD,
+                 cache_dir: str = "policy_tables"):
+        """
+        Parameters
+        ----------
+        room_size : int
+            Size of the room.
+        action_penalty : float, optional
+            Penalty of every action but the successful grab. The default is
+            ACTION_PENALTY.
+        grab_reward : float, optional
+            Reward for grabbing the banana. The default is GRAB_BANANA_REWARD.
+        cache_dir : str, optional
+            Directory of the saved policy tables. The default is "policy_tables".
+
+        """
+        policy = load_policy_table(room_size, action_penalty, grab_reward, cache_dir)
+        
+        # Table of MonkeyBananaAction indexed by (box, banana, monkey up)
+        actions = np.empty(len(MonkeyBananaAction), dtype=object)
+        actions[:] = list(MonkeyBananaAction)
+        self.policy = actions[policy]
+    
+    
+    def choose_action(self, env: MonkeyBananaFOEnvironmentTask, verbose: bool = False):
+        state = env.perceive()
+        return self.policy[state.box_position, state.banana_position, int(state.is_monkey_up)]
+
+
+
+# Total variation between two beliefs under which BeliefAgent considers that
+# its beliefs did not change
+BELIEF_CHANGE = 5e-2
+
+
+
 class BeliefAgent(Agent):
     """
     Bayesian rule-based agent (Section 6)
     """
     
-    def __init__(self, env_size: int):
+    def __init__(self, env_size: int, policy: PointBasedPolicy = None, n_particles: int = None):
+        """
+        Parameters
+        ----------
+        env_size : int
+            Size of the room.
+        policy : PointBasedPolicy, optional
+            Policy acting on the beliefs. The default is to compute it with
+            point_based_value_iteration at the first call of choose_action.
+        n_particles : int, optional
+            Track the beliefs with a particle filter of n_particles particles
+            (see update_particles) instead of the exact Bayesian update. The
+            default is the exact update.
+
+        """
         self.env_size = env_size
         self.beliefs = np.ones(env_size) / env_size
+        self.likelihoods = smell_likelihood_table(env_size)
+        self.n_particles = n_particles
+        self.particles = None
+        self.weights = None
+        # Observed states met since the beliefs last changed
+        self.seen = set()
+        self.seen_beliefs = None
+        self.policy = policy
+        self.last_action = None
+        self.last_observation = None
+
+
+    def _init_particles(self):
+        """
+        Draws the particles uniformly over the room at the first update, with
+        the generator of the agent.
+        """
+        if self.particles is None:
+            rng = np.random.default_rng() if self.rng is None else self.rng
+            self.particles = rng.integers(self.env_size, size=self.n_particles)
+            self.weights = np.full(self.n_particles, 1 / self.n_particles)
 
 
     def update_belief(self, obs: MonkeyBananaPartialObservation):
@@ -224,14 +506,70 @@ class BeliefAgent(Agent):
             # Monkey is not on the box => no update
             return 
         
-        # TODO: Question 15: Implement Bayesian belief update here
-        self.beliefs = self.beliefs 
+        if self.n_particles is not None:
+            self._init_particles()
+            self.particles, self.weights = update_particles(self.particles, self.weights, obs.box_position,
+                                                            obs.smells_banana, self.likelihoods, self.rng)
+            self.beliefs = particle_beliefs(self.particles, self.weights, self.env_size)
+            return
+        
+        # Bayesian belief update, see belief.py
+        self.beliefs = update_beliefs(self.beliefs, obs.box_position, obs.is_monkey_up, 
+                                      obs.smells_banana, self.likelihoods)
 
     
-    def choose_action(self, env: MonkeyBananaPOEnvironmentTask, verbose:str):
-        # TODO: Question 16
-        if np.any(self.beliefs > 0.7):
-            return None
-        return None
-
-
+    def choose_action(self, env: MonkeyBananaPOEnvironmentTask, verbose:str = False):
+        obs = env.perceive()
+        
+        if self.last_action == MonkeyBananaAction.GRAB and self.last_observation.is_monkey_up:
+            # The episode is not over => the banana is not above the box
+            if self.n_particles is not None:
+                self._init_particles()
+                self.particles, self.weights = reweight_particles(
+                    self.particles, np.where(self.particles == obs.box_position, 0, self.weights),
+                    self.env_size, self.rng)
+                self.beliefs = particle_beliefs(self.particles, self.weights, self.env_size)
+            else:
+                self.beliefs[obs.box_position] = 0
+                self.beliefs /= self.beliefs.sum()
+        
+        self.update_belief(obs)
+        
+        if self.policy is None:
+            self.policy = point_based_value_iteration(self.env_size)
+        
+        # On the ground the beliefs do not change, and the policy only depends
+        # on the observed state and the beliefs, so coming back to a seen
+        # (state, beliefs) pair means the policy loops. The agent then
+        # heads to the most likely position of the banana and climbs instead.
+        # Observations which are about as likely at every believed position,
+        # e.g. far from the box or symmetric around it, barely change the
+        # beliefs, so they only count as changed beyond a total variation of
+        # BELIEF_CHANGE since the states were last forgotten
+        if self.seen_beliefs is None or np.abs(self.beliefs - self.seen_beliefs).sum() > BELIEF_CHANGE:
+            self.seen, self.seen_beliefs = set(), self.beliefs.copy()
+        key = (obs.box_position, obs.is_monkey_up)
+        action = None if key in self.seen else self.policy.action(obs.box_position, obs.is_monkey_up, self.beliefs)
+        self.seen.add(key)
+        # Grabbing where the banana cannot be is a loop as well, the failed
+        # grab leaving the beliefs unchanged
+        if action is None or (action == MonkeyBananaAction.GRAB and self.beliefs[obs.box_position] == 0):
+            action = self._most_likely_action(obs)
+        self.last_action = action
+        self.last_observation = obs
+        return self.last_action
+    
+    
+    def _most_likely_action(self, obs: MonkeyBananaPartialObservation):
+        """
+        Action leading to the most likely position of the banana, to climb
+        and grab there.
+        """
+        target = int(np.argmax(self.beliefs))
+        if obs.is_monkey_up:
+            return MonkeyBananaAction.GRAB if obs.box_position == target else MonkeyBananaAction.GO_DOWN
+        if obs.box_position < target:
+            return MonkeyBananaAction.MOVE_BOX_RIGHT
+        if obs.box_position > target:
+            return MonkeyBananaAction.MOVE_BOX_LEFT
+        return MonkeyBananaAction.CLIMB
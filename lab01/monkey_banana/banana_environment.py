@@ -1,7 +1,10 @@
 from dataclasses import dataclass
 from enum import Enum
+from functools import lru_cache
 import numpy as np
 
+from . rendering import Renderer, render_frame
+
 
 # Parameters for the reward
 
@@ -15,13 +18,19 @@ GRAB_ORANGE_REWARD = 2
 SMELL_ALPHA = 0.8
 
 
+# Number of bits used for each position in the packed states
+
+POSITION_BITS = 31
+
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class MonkeyBananaState:
     """
     Class describing states of the environment. A state is given by the
     position of the box, the position of the banana and the position of
-    the monkey. 
+    the monkey. States are immutable and can be packed into a single int
+    (box position, banana position, monkey up bit).
     """
     box_position: int
     banana_position: int
@@ -30,8 +39,71 @@ class MonkeyBananaState:
     def vector_representation(self):
         return (self.box_position, self.banana_position, self.is_monkey_up)
     
+    def pack(self):
+        return (self.box_position << (POSITION_BITS + 1)) | (self.banana_position << 1) | int(self.is_monkey_up)
+    
+    @staticmethod
+    def unpack(code: int):
+        return MonkeyBananaState(code >> (POSITION_BITS + 1),
+                                 (code >> 1) & ((1 << POSITION_BITS) - 1),
+                                 bool(code & 1))
+    
+    def __hash__(self):
+        return self.pack()
+
+
+
+def encode_states(box_positions, banana_positions, is_monkey_up):
+    """
+    Packs many states at once, as MonkeyBananaState.pack does.
+
+    Parameters
+    ----------
+    box_positions : array_like
+        Positions of the box.
+    banana_positions : array_like
+        Positions of the banana.
+    is_monkey_up : array_like
+        Whether the monkey is on the box.
+
+    Returns
+    -------
+    codes : np.ndarray
+        Packed states as int64.
+
+    """
+    return (np.left_shift(np.asarray(box_positions, dtype=np.int64), POSITION_BITS + 1)
+            | np.left_shift(np.asarray(banana_positions, dtype=np.int64), 1)
+            | np.asarray(is_monkey_up, dtype=np.int64))
+
+
+
+def decode_states(codes):
+    """
+    Unpacks many states at once, as MonkeyBananaState.unpack does.
+
+    Parameters
+    ----------
+    codes : array_like
+        Packed states.
+
+    Returns
+    -------
+    box_positions : np.ndarray
+        Positions of the box.
+    banana_positions : np.ndarray
+        Positions of the banana.
+    is_monkey_up : np.ndarray
+        Whether the monkey is on the box.
+
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    return (codes >> (POSITION_BITS + 1),
+            (codes >> 1) & ((1 << POSITION_BITS) - 1),
+            (codes & 1).astype(bool))
+    
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class MonkeyBananaPartialObservation:
     """
     Class describing the perceived state of the environment, when the position
@@ -53,13 +125,73 @@ class MonkeyBananaAction(Enum):
 
 
 
+def step(state: MonkeyBananaState, action: MonkeyBananaAction, room_size: int):
+    """
+    Transition function of the environment. The given state is not modified.
+
+    Parameters
+    ----------
+    state : MonkeyBananaState
+        Current state.
+    action : MonkeyBananaAction
+        Action to perform.
+    room_size : int
+        Size of the room.
+
+    Returns
+    -------
+    state : MonkeyBananaState
+        Next state.
+    reward : float
+        Reward of the action.
+    done : bool
+        Whether the banana was grabbed.
+
+    """
+    box_position, banana_position, is_monkey_up = state.box_position, state.banana_position, state.is_monkey_up
+    
+    if action == MonkeyBananaAction.GRAB:
+        if is_monkey_up and box_position == banana_position:
+            return state, GRAB_BANANA_REWARD, True
+        
+    elif action == MonkeyBananaAction.CLIMB:
+        is_monkey_up = True
+        
+    elif action == MonkeyBananaAction.GO_DOWN:
+        is_monkey_up = False
+        
+    elif action == MonkeyBananaAction.MOVE_BOX_LEFT:
+        if box_position > 0:
+            box_position = box_position - 1
+    
+    elif action == MonkeyBananaAction.MOVE_BOX_RIGHT:
+        if box_position < room_size - 1:
+            box_position = box_position + 1
+    
+    else:
+        return state, 0, False
+    
+    return MonkeyBananaState(box_position, banana_position, is_monkey_up), -ACTION_PENALTY, False
+
+
+
+def smell_probability(banana_position, box_position):
+    """
+    Probability for the monkey on the box to smell the banana. Works on
+    scalars as well as on NumPy arrays.
+    """
+    return 1 / (1 + SMELL_ALPHA * (banana_position - box_position)**2)
+
+
+
 class MonkeyBananaEnvironmentTask:
     """
     Description of the general environment of the monkey and banana problem
     """
     
     
-    def __init__(self, initial_banana_position: int, initial_box_position: int, room_size: int = 5):
+    def __init__(self, initial_banana_position: int, initial_box_position: int, room_size: int = 5,
+                 rng: np.random.Generator = None):
         
         assert (initial_banana_position >= 0 and initial_banana_position < room_size), \
             "Banana position must be between 0 and the room size"
@@ -68,62 +200,28 @@ class MonkeyBananaEnvironmentTask:
             "Box position must be between 0 and the room size"
         
         self.score = 0
+        # Reward of the last action performed
+        self.last_reward = None
         self.state = MonkeyBananaState(initial_box_position, initial_banana_position, False)
         self.room_size = room_size
+        
+        # Random generator of the environment. The default (None) is to use
+        # the global generator of NumPy.
+        self.rng = rng
     
     
     def _is_box_under_banana(self):
         return self.state.banana_position == self.state.box_position
     
-    def visualize(self):
-        level_2 = [" "] * (self.room_size * 2 - 1)
-        level_2[self.state.banana_position * 2] = '🍌'
-
-
-        if self.state.is_monkey_up:
-            level_1 = [" "] * (self.room_size * 2 - 1)
-            level_1[self.state.box_position * 2] = '🐒'
-        else: 
-            level_1 = [" "] * (self.room_size * 2)
-        
-        if not self.state.is_monkey_up:
-            level_0 = [" "] * (self.room_size * 2 - 2)
-            level_0[max(self.state.box_position * 2 - 1, 0)] = '██'
+    def visualize(self, renderer: "Renderer" = None):
+        """
+        Draws the room. The default is to print it, a Renderer can instead
+        discard, buffer or record the frames, see rendering.
+        """
+        if renderer is None:
+            print(render_frame(self.state, self.room_size), end='')
         else:
-            level_0 = [" "] * (self.room_size * 2 - 1)
-            level_0[self.state.box_position * 2] = '██'
-        
-           
-        if not(self.state.is_monkey_up):
-            if self.state.box_position == 0:
-                level_0[1] = '🐒'
-            else:
-                level_0[0] = '🐒'
-        
-        box_top =    ["─" * self.room_size * 2]
-        box_bottom = ['─' * self.room_size * 2]
-        
-        box_top =    ['┌'] + box_top +    ['┐']
-        level_2 =    ['|'] + level_2 +    ['|']
-        level_1 =    ['|'] + level_1 +    ['|']
-        level_0 =    ['|'] + level_0 +    ['|']
-        box_bottom = ['└'] + box_bottom + ['┘']
-
-        # stdscr.addstr(0, 0, '   ' + ''.join(box_top))
-        # stdscr.addstr(1, 0, '   ' + ''.join(level_2))
-        # stdscr.addstr(2, 0, '   ' + ''.join(level_1))
-        # stdscr.addstr(3, 0, '   ' + ''.join(level_0))
-        # stdscr.addstr(4, 0, '   ' + ''.join(box_bottom))
-        # stdscr.refresh()
-        # time.sleep(0.05)
-        
-        print('\n')
-        print('   ', ''.join(box_top))
-        print('   ', ''.join(level_2))
-        print('   ', ''.join(level_1))
-        print('   ', ''.join(level_0))
-        print('   ', ''.join(box_bottom))
-        print('\n')
+            renderer.render(self.state, self.room_size)
     
     
     def performance(self):
@@ -143,38 +241,37 @@ class MonkeyBananaEnvironmentTask:
     
     
     def perform_action(self, action: MonkeyBananaAction):
-        if action == MonkeyBananaAction.GRAB:
-            if self.state.is_monkey_up and self._is_box_under_banana():
-                self.score += GRAB_BANANA_REWARD
-                return True
-            else:
-                self.score -= ACTION_PENALTY
-            
-        elif action == MonkeyBananaAction.CLIMB:
-            self.score -= ACTION_PENALTY
-            self.state.is_monkey_up = True
-            
-        elif action == MonkeyBananaAction.GO_DOWN:
-            self.score -= ACTION_PENALTY
-            self.state.is_monkey_up = False
-            
-        elif action == MonkeyBananaAction.MOVE_BOX_LEFT:
-            self.score -= ACTION_PENALTY
-            if self.state.box_position > 0:
-                self.state.box_position = self.state.box_position - 1
-        
-        elif action == MonkeyBananaAction.MOVE_BOX_RIGHT:
-            self.score -= ACTION_PENALTY
-            if self.state.box_position < self.room_size - 1:
-                self.state.box_position = self.state.box_position + 1
-            
-        return False
+        self.state, self.last_reward, done = step(self.state, action, self.room_size)
+        self.score += self.last_reward
+        return done
+    
+    
+    def snapshot(self):
+        """
+        Returns a token describing the current state and score, which can be
+        given to restore to come back to this point.
+        """
+        return (self.state, self.score)
+    
+    
+    def restore(self, token: tuple):
+        """
+        Restores the state and score saved by snapshot.
+        """
+        self.state, self.score = token
     
     
     def perceive(self):
         pass
     
     
+    def _random(self):
+        """
+        Draws a number uniformly in [0, 1) with the generator of the environment.
+        """
+        return np.random.rand() if self.rng is None else self.rng.random()
+    
+    
     
 class MonkeyBananaFOEnvironmentTask(MonkeyBananaEnvironmentTask):
     """
@@ -200,15 +297,24 @@ class MonkeyBananaPOEnvironmentTask(MonkeyBananaEnvironmentTask):
         """
         smells_banana = False
         
-        proba_smell =  1 / (1 + SMELL_ALPHA * (self.state.banana_position - self.state.box_position)**2)
+        proba_smell = smell_probability(self.state.banana_position, self.state.box_position)
         
-        if self.state.is_monkey_up and np.random.rand() < proba_smell:
+        if self.state.is_monkey_up and self._random() < proba_smell:
             smells_banana = True
             
             
-        return MonkeyBananaPartialObservation(self.state.box_position, 
-                                              self.state.is_monkey_up, 
-                                              smells_banana)
+        return _partial_observation(self.state.box_position, 
+                                    self.state.is_monkey_up, 
+                                    smells_banana)
+
+
+
+@lru_cache(maxsize=None)
+def _partial_observation(box_position: int, is_monkey_up: bool, smells_banana: bool):
+    """
+    Observations are immutable, so a single instance is shared for each value.
+    """
+    return MonkeyBananaPartialObservation(box_position, is_monkey_up, smells_banana)
 
         
 
@@ -0,0 +1,310 @@
+import numpy as np
+
+from . banana_environment import ACTION_PENALTY, GRAB_BANANA_REWARD
+from . banana_environment import MonkeyBananaAction
+from . banana_environment import smell_probability
+
+
+
+# Actions available to the monkey, in the same order as returned by
+# MonkeyBananaEnvironmentTask.available_actions(). Rows are indexed by the
+# is_monkey_up flag, unused entries are padded with -1.
+
+AVAILABLE_ACTIONS_TABLE = np.array([
+    [MonkeyBananaAction.MOVE_BOX_LEFT.value,
+     MonkeyBananaAction.MOVE_BOX_RIGHT.value,
+     MonkeyBananaAction.GRAB.value,
+     MonkeyBananaAction.CLIMB.value],
+    [MonkeyBananaAction.GO_DOWN.value,
+     MonkeyBananaAction.GRAB.value,
+     -1,
+     -1],
+])
+
+NUMBER_OF_AVAILABLE_ACTIONS = np.array([4, 2])
+
+
+
+class MonkeyBananaBatchEnvironment:
+    """
+    Fully observable monkey and banana environment simulating many independent
+    episodes at once. The state of every episode is stored in NumPy arrays and
+    each call to perform_actions advances all running episodes by one step,
+    following exactly the rules of MonkeyBananaEnvironmentTask.perform_action.
+    """
+
+
+    def __init__(self, initial_banana_positions, initial_box_positions, room_size: int = 5, n_episodes: int = None):
+        """
+        Parameters
+        ----------
+        initial_banana_positions : int or array_like
+            Initial position of the banana, either shared by all episodes or
+            given per episode.
+        initial_box_positions : int or array_like
+            Initial position of the box, either shared by all episodes or
+            given per episode.
+        room_size : int, optional
+            Size of the room. The default is 5.
+        n_episodes : int, optional
+            Number of episodes. Only required if both initial positions are
+            scalars.
+
+        """
+        banana_positions = np.asarray(initial_banana_positions, dtype=np.int64)
+        box_positions = np.asarray(initial_box_positions, dtype=np.int64)
+
+        if n_episodes is None:
+            n_episodes = np.broadcast(banana_positions, box_positions).size
+
+        assert np.all((banana_positions >= 0) & (banana_positions < room_size)), \
+            "Banana position must be between 0 and the room size"
+
+        assert np.all((box_positions >= 0) & (box_positions < room_size)), \
+            "Box position must be between 0 and the room size"
+
+        self.room_size = room_size
+        self.n_episodes = n_episodes
+        self.banana_positions = np.broadcast_to(banana_positions, (n_episodes,)).copy()
+        self.box_positions = np.broadcast_to(box_positions, (n_episodes,)).copy()
+        self.is_monkey_up = np.zeros(n_episodes, dtype=bool)
+        self.scores = np.zeros(n_episodes, dtype=np.float64)
+        self.steps = np.zeros(n_episodes, dtype=np.int64)
+        self.done = np.zeros(n_episodes, dtype=bool)
+
+
+    def performance(self):
+        return self.scores
+
+
+    def available_actions(self):
+        """
+        Returns the actions available in every episode.
+
+        Returns
+        -------
+        actions : np.ndarray
+            Array of shape (n_episodes, 4) containing the values of the
+            available actions, padded with -1.
+        n_actions : np.ndarray
+            Number of available actions of every episode.
+
+        """
+        up = self.is_monkey_up.astype(np.int64)
+        return AVAILABLE_ACTIONS_TABLE[up], NUMBER_OF_AVAILABLE_ACTIONS[up]
+
+
+    def sample_random_actions(self, rng: np.random.Generator = None):
+        """
+        Draws for every episode an action uniformly among the available ones,
+        as the RandomAgent does.
+
+        Parameters
+        ----------
+        rng : np.random.Generator, optional
+            Random generator. The default is a fresh unseeded generator.
+
+        Returns
+        -------
+        actions : np.ndarray
+            Values of the chosen actions.
+
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+
+        up = self.is_monkey_up.astype(np.int64)
+        choice = (rng.random(self.n_episodes) * NUMBER_OF_AVAILABLE_ACTIONS[up]).astype(np.int64)
+        return AVAILABLE_ACTIONS_TABLE[up, choice]
+
+
+    def smell_banana(self, rng: np.random.Generator = None):
+        """
+        Samples what the monkey smells in every episode, following the model of
+        MonkeyBananaPOEnvironmentTask.perceive. Used together with
+        belief.update_beliefs to run many partially observable agents at once.
+
+        Parameters
+        ----------
+        rng : np.random.Generator, optional
+            Random generator. The default is a fresh unseeded generator.
+
+        Returns
+        -------
+        smells_banana : np.ndarray
+            Mask of the episodes where the monkey smells the banana.
+
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+
+        proba_smell = smell_probability(self.banana_positions, self.box_positions)
+        return self.is_monkey_up & (rng.random(self.n_episodes) < proba_smell)
+
+
+    def perform_actions(self, actions):
+        """
+        Performs one action in every running episode. Actions given for
+        episodes which are already over are ignored.
+
+        Parameters
+        ----------
+        actions : array_like
+            Values of the MonkeyBananaAction to perform, one per episode.
+
+        Returns
+        -------
+        done : np.ndarray
+            Mask of the episodes which are over after this step.
+
+        """
+        actions = np.asarray(actions)
+        running = np.flatnonzero(~self.done)
+        self._perform_actions(running, actions[running])
+        return self.done.copy()
+
+
+    def _perform_actions(self, episodes: np.ndarray, actions: np.ndarray):
+        """
+        Performs the given actions in the given running episodes.
+
+        Parameters
+        ----------
+        episodes : np.ndarray
+            Indices of the episodes.
+        actions : np.ndarray
+            Values of the MonkeyBananaAction to perform in these episodes.
+
+        Returns
+        -------
+        victory : np.ndarray
+            Mask of the given episodes which are won by this step.
+
+        """
+        box_positions = self.box_positions[episodes]
+        is_monkey_up = self.is_monkey_up[episodes]
+
+        victory = (actions == MonkeyBananaAction.GRAB.value) & is_monkey_up \
+            & (box_positions == self.banana_positions[episodes])
+
+        # Every action but the successful grab costs the same penalty
+        self.scores[episodes] = np.where(victory,
+                                         self.scores[episodes] + GRAB_BANANA_REWARD,
+                                         self.scores[episodes] - ACTION_PENALTY)
+
+        is_monkey_up[actions == MonkeyBananaAction.CLIMB.value] = True
+        is_monkey_up[actions == MonkeyBananaAction.GO_DOWN.value] = False
+        box_positions[(actions == MonkeyBananaAction.MOVE_BOX_LEFT.value) & (box_positions > 0)] -= 1
+        box_positions[(actions == MonkeyBananaAction.MOVE_BOX_RIGHT.value) & (box_positions < self.room_size - 1)] += 1
+
+        self.box_positions[episodes] = box_positions
+        self.is_monkey_up[episodes] = is_monkey_up
+        self.steps[episodes] += 1
+        self.done[episodes] = victory
+        return victory
+
+
+    def _transition_tables(self):
+        """
+        Builds lookup tables of the transitions of a single episode. States are
+        encoded as box_position * 2 + is_monkey_up and the entry state * 4 + i
+        corresponds to the i-th action of AVAILABLE_ACTIONS_TABLE.
+
+        Returns
+        -------
+        next_states : np.ndarray
+            Encoded state reached by each (state, action) pair.
+        is_grab_up : np.ndarray
+            Whether the action is a grab performed on top of the box.
+
+        """
+        n_states = self.room_size * 2
+        next_states = np.zeros(n_states * 4, dtype=np.int32)
+        is_grab_up = np.zeros(n_states * 4, dtype=bool)
+
+        for state in range(n_states):
+            box_position, up = divmod(state, 2)
+            for i in range(NUMBER_OF_AVAILABLE_ACTIONS[up]):
+                action = AVAILABLE_ACTIONS_TABLE[up, i]
+                next_box_position, next_up = box_position, up
+                if action == MonkeyBananaAction.CLIMB.value:
+                    next_up = 1
+                elif action == MonkeyBananaAction.GO_DOWN.value:
+                    next_up = 0
+                elif action == MonkeyBananaAction.MOVE_BOX_LEFT.value:
+                    next_box_position = max(box_position - 1, 0)
+                elif action == MonkeyBananaAction.MOVE_BOX_RIGHT.value:
+                    next_box_position = min(box_position + 1, self.room_size - 1)
+                next_states[state * 4 + i] = next_box_position * 2 + next_up
+                is_grab_up[state * 4 + i] = up and action == MonkeyBananaAction.GRAB.value
+
+        return next_states, is_grab_up
+
+
+    def run_random_agents(self, rng: np.random.Generator = None, max_steps: int = None):
+        """
+        Runs a random agent in every episode until all episodes are over. Only
+        the episodes which are still running are simulated at each step, using
+        precomputed transition tables instead of the per action updates of
+        perform_actions.
+
+        Parameters
+        ----------
+        rng : np.random.Generator, optional
+            Random generator. The default is a fresh unseeded generator.
+        max_steps : int, optional
+            Maximal number of steps. The default is no limit.
+
+        Returns
+        -------
+        done : np.ndarray
+            Mask of the episodes which are over.
+
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+
+        next_states, is_grab_up = self._transition_tables()
+
+        episodes = np.flatnonzero(~self.done)
+        states = self.box_positions[episodes].astype(np.int32) * 2 + self.is_monkey_up[episodes]
+        banana_positions = self.banana_positions[episodes].astype(np.int32)
+        scores = self.scores[episodes]
+        steps = self.steps[episodes]
+
+        n = 0
+        while episodes.size > 0 and (max_steps is None or n < max_steps):
+            # A random byte masked with 3 (monkey down) or 1 (monkey up) gives
+            # a uniform choice among the available actions
+            random_bytes = np.frombuffer(rng.bytes(episodes.size), dtype=np.uint8)
+            choice = random_bytes & (3 - 2 * (states & 1))
+            index = (states << 2) | choice
+
+            victory = is_grab_up[index] & ((states >> 1) == banana_positions)
+            won_scores = scores[victory] + GRAB_BANANA_REWARD
+            scores -= ACTION_PENALTY
+            states = next_states[index]
+            steps += 1
+            n += 1
+
+            if won_scores.size > 0:
+                finished = episodes[victory]
+                self.box_positions[finished] = states[victory] >> 1
+                self.is_monkey_up[finished] = (states[victory] & 1).astype(bool)
+                self.scores[finished] = won_scores
+                self.steps[finished] = steps[victory]
+                self.done[finished] = True
+
+                running = ~victory
+                episodes = episodes[running]
+                states = states[running]
+                banana_positions = banana_positions[running]
+                scores = scores[running]
+                steps = steps[running]
+
+        self.box_positions[episodes] = states >> 1
+        self.is_monkey_up[episodes] = (states & 1).astype(bool)
+        self.scores[episodes] = scores
+        self.steps[episodes] = steps
+
+        return self.done.copy()
@@ -0,0 +1,142 @@
+import numpy as np
+
+from . banana_environment import smell_probability
+
+
+
+def smell_likelihood_table(room_size: int):
+    """
+    Precomputes the likelihood of every observation of the monkey on the box.
+
+    Parameters
+    ----------
+    room_size : int
+        Size of the room.
+
+    Returns
+    -------
+    likelihoods : np.ndarray
+        Array of shape (2, room_size, room_size), where
+        likelihoods[smells, box_position, banana_position] is the probability
+        to smell (smells = 1) or not to smell (smells = 0) the banana.
+
+    """
+    box_positions, banana_positions = np.indices((room_size, room_size))
+    proba_smell = smell_probability(banana_positions, box_positions)
+    return np.stack((1 - proba_smell, proba_smell))
+
+
+
+def update_beliefs(beliefs: np.ndarray, box_positions, is_monkey_up, smells_banana, likelihoods: np.ndarray):
+    """
+    Bayesian update of the beliefs over the position of the banana, for a
+    single agent or for many independent agents at once.
+
+    Parameters
+    ----------
+    beliefs : np.ndarray
+        Beliefs of shape (room_size,) or (n_agents, room_size).
+    box_positions : int or array_like
+        Observed positions of the box, one per agent.
+    is_monkey_up : bool or array_like
+        Observed positions of the monkey, one per agent. The beliefs of the
+        agents whose monkey is not on the box are not updated.
+    smells_banana : bool or array_like
+        Observed smells, one per agent.
+    likelihoods : np.ndarray
+        Table returned by smell_likelihood_table.
+
+    Returns
+    -------
+    beliefs : np.ndarray
+        Updated beliefs, with the same shape as the given ones.
+
+    """
+    single = beliefs.ndim == 1
+    beliefs = np.atleast_2d(beliefs)
+    n_agents = beliefs.shape[0]
+
+    box_positions = np.broadcast_to(np.asarray(box_positions, dtype=np.intp), (n_agents,))
+    is_monkey_up = np.broadcast_to(np.asarray(is_monkey_up, dtype=bool), (n_agents,))
+    smells_banana = np.broadcast_to(np.asarray(smells_banana, dtype=np.intp), (n_agents,))
+
+    posterior = beliefs * likelihoods[smells_banana, box_positions]
+    normalization = posterior.sum(axis=1, keepdims=True)
+
+    # Monkey not on the box => no update
+    keep = ~is_monkey_up[:, None] | (normalization == 0)
+    beliefs = np.where(keep, beliefs, posterior / np.where(normalization == 0, 1, normalization))
+
+    return beliefs[0] if single else beliefs
+
+
+
+def update_particles(particles: np.ndarray, weights: np.ndarray, box_position: int, smells_banana: bool,
+                     likelihoods: np.ndarray, rng: np.random.Generator = None, resample_threshold: float = 0.5):
+    """
+    Particle filter update of the beliefs over the position of the banana,
+    for the monkey on the box. Each particle is a possible banana position,
+    weighted by the likelihood of the observation. The particles are
+    resampled (systematic resampling) when the effective sample size falls
+    below resample_threshold times their number.
+
+    Parameters
+    ----------
+    particles : np.ndarray
+        Banana position of each particle.
+    weights : np.ndarray
+        Normalized weight of each particle.
+    box_position : int
+        Observed position of the box.
+    smells_banana : bool
+        Observed smell.
+    likelihoods : np.ndarray
+        Table returned by smell_likelihood_table.
+    rng : np.random.Generator, optional
+        Generator used to resample. The default is a fresh unseeded generator.
+    resample_threshold : float, optional
+        Fraction of the particles under which the effective sample size
+        triggers a resampling. The default is 0.5.
+
+    Returns
+    -------
+    particles : np.ndarray
+        Updated particles.
+    weights : np.ndarray
+        Updated normalized weights.
+
+    """
+    return reweight_particles(particles, weights * likelihoods[int(smells_banana), box_position, particles],
+                              likelihoods.shape[-1], rng, resample_threshold)
+
+
+
+def reweight_particles(particles: np.ndarray, weights: np.ndarray, room_size: int, rng: np.random.Generator = None,
+                       resample_threshold: float = 0.5):
+    """
+    Normalizes unnormalized particle weights and resamples the particles if
+    needed, see update_particles. When every weight is zero, the particles
+    are drawn again uniformly over the room.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    n_particles = len(particles)
+
+    total = weights.sum()
+    if total == 0:
+        return rng.integers(room_size, size=n_particles), np.full(n_particles, 1 / n_particles)
+    weights = weights / total
+
+    if 1 / np.sum(weights ** 2) < resample_threshold * n_particles:
+        positions = (rng.random() + np.arange(n_particles)) / n_particles
+        indices = np.minimum(np.searchsorted(np.cumsum(weights), positions), n_particles - 1)
+        particles, weights = particles[indices], np.full(n_particles, 1 / n_particles)
+
+    return particles, weights
+
+
+
+def particle_beliefs(particles: np.ndarray, weights: np.ndarray, room_size: int):
+    """
+    Beliefs over the position of the banana represented by weighted particles.
+    """
+    return np.bincount(particles, weights, minlength=room_size)
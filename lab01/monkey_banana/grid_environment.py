@@ -0,0 +1,308 @@
+from dataclasses import dataclass
+from enum import Enum
+import numpy as np
+
+from . banana_environment import ACTION_PENALTY, GRAB_BANANA_REWARD, GRAB_ORANGE_REWARD
+from . rendering import Renderer
+
+
+
+@dataclass(frozen=True, slots=True)
+class GridState:
+    """
+    State of the grid environment packed into a single int (see
+    GridMonkeyBananaEnvironmentTask.encode). States are immutable and hashed by
+    their code.
+    """
+    code: int
+
+    def vector_representation(self):
+        return self.code
+
+    def pack(self):
+        # Packed states are stored as int64, e.g. by TrajectoryRecorder
+        if self.code.bit_length() > 63:
+            raise ValueError(f"State code of {self.code.bit_length()} bits does not fit in an int64")
+        return self.code
+
+    @staticmethod
+    def unpack(code: int):
+        return GridState(code)
+
+    def __hash__(self):
+        return self.code
+
+
+
+class GridAction(Enum):
+    GRAB       = 0
+    CLIMB      = 1
+    GO_DOWN    = 2
+    MOVE_NORTH = 3
+    MOVE_SOUTH = 4
+    MOVE_WEST  = 5
+    MOVE_EAST  = 6
+    PUSH_NORTH = 7
+    PUSH_SOUTH = 8
+    PUSH_WEST  = 9
+    PUSH_EAST  = 10
+
+
+MOVES = (GridAction.MOVE_NORTH, GridAction.MOVE_SOUTH, GridAction.MOVE_WEST, GridAction.MOVE_EAST)
+PUSHES = (GridAction.PUSH_NORTH, GridAction.PUSH_SOUTH, GridAction.PUSH_WEST, GridAction.PUSH_EAST)
+DIRECTIONS = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
+
+
+class GridMonkeyBananaEnvironmentTask:
+    """
+    Fully observable monkey and banana problem in a 2-D room with several
+    boxes, bananas and oranges hanging from the ceiling. The monkey walks on
+    the floor, pushes the box of its cell, climbs on it and grabs the fruit
+    above. Grabbing a banana or an orange removes it, and the episode ends
+    when every banana is grabbed.
+
+    The state is a single int made of the monkey up bit, the cell of the
+    monkey, and one bitboard (one bit per cell, cell = y * width + x) for the
+    boxes, the bananas and the oranges, so successors are computed with a few
+    bit operations.
+
+    Parameters
+    ----------
+    width : int
+        Width of the room.
+    height : int
+        Height of the room.
+    monkey_position : tuple
+        (x, y) initial position of the monkey.
+    box_positions : list
+        (x, y) positions of the boxes.
+    banana_positions : list
+        (x, y) positions of the bananas.
+    orange_positions : list, optional
+        (x, y) positions of the oranges. The default is no orange.
+
+    """
+
+    def __init__(self, width: int, height: int, monkey_position: tuple, box_positions: list,
+                 banana_positions: list, orange_positions: list = (), rng: np.random.Generator = None):
+
+        assert len(banana_positions) > 0, "There must be at least one banana"
+
+        self.width = width
+        self.height = height
+        self.n_cells = width * height
+        self.cell_bits = max((self.n_cells - 1).bit_length(), 1)
+
+        self.boxes_offset = 1 + self.cell_bits
+        self.bananas_offset = self.boxes_offset + self.n_cells
+        self.oranges_offset = self.bananas_offset + self.n_cells
+        self.cells_mask = (1 << self.n_cells) - 1
+
+        # Neighbor cell of every cell in each direction, -1 outside the room
+        self.neighbors = []
+        for dx, dy in DIRECTIONS:
+            self.neighbors.append([
+                (y + dy) * width + (x + dx) if 0 <= x + dx < width and 0 <= y + dy < height else -1
+                for y in range(height) for x in range(width)
+            ])
+
+        self.score = 0
+        # Reward of the last action performed
+        self.last_reward = None
+        self.state = GridState(self.encode(self._cell(monkey_position), False,
+                                           self._bitboard(box_positions),
+                                           self._bitboard(banana_positions),
+                                           self._bitboard(orange_positions)))
+        self.rng = rng
+
+
+    def _cell(self, position: tuple):
+        x, y = position
+        assert 0 <= x < self.width and 0 <= y < self.height, "Positions must be inside the room"
+        return y * self.width + x
+
+
+    def _bitboard(self, positions: list):
+        bitboard = 0
+        for position in positions:
+            bitboard |= 1 << self._cell(position)
+        return bitboard
+
+
+    def encode(self, monkey_cell: int, is_monkey_up: bool, boxes: int, bananas: int, oranges: int):
+        return (int(is_monkey_up) | (monkey_cell << 1) | (boxes << self.boxes_offset)
+                | (bananas << self.bananas_offset) | (oranges << self.oranges_offset))
+
+
+    def decode(self, code: int):
+        """
+        Returns (monkey_cell, is_monkey_up, boxes, bananas, oranges) of a packed
+        state, the last three as bitboards.
+        """
+        return ((code >> 1) & ((1 << self.cell_bits) - 1),
+                bool(code & 1),
+                (code >> self.boxes_offset) & self.cells_mask,
+                (code >> self.bananas_offset) & self.cells_mask,
+                code >> self.oranges_offset)
+
+
+    def available_actions_of(self, code: int):
+        if code & 1:
+            return [GridAction.GO_DOWN, GridAction.GRAB]
+
+        monkey_cell = (code >> 1) & ((1 << self.cell_bits) - 1)
+        if (code >> (self.boxes_offset + monkey_cell)) & 1:
+            return [*MOVES, *PUSHES, GridAction.CLIMB]
+        return list(MOVES)
+
+
+    def step(self, code: int, action: GridAction):
+        """
+        Transition function of the environment on packed states.
+
+        Returns
+        -------
+        code : int
+            Next packed state.
+        reward : float
+            Reward of the action.
+        done : bool
+            Whether the last banana was grabbed.
+
+        """
+        monkey_cell = (code >> 1) & ((1 << self.cell_bits) - 1)
+        monkey_bit = 1 << monkey_cell
+
+        if action == GridAction.GRAB:
+            if code & 1:
+                if (code >> self.bananas_offset) & monkey_bit:
+                    code ^= monkey_bit << self.bananas_offset
+                    done = (code >> self.bananas_offset) & self.cells_mask == 0
+                    return code, GRAB_BANANA_REWARD, done
+                if (code >> self.oranges_offset) & monkey_bit:
+                    return code ^ (monkey_bit << self.oranges_offset), GRAB_ORANGE_REWARD, False
+
+        elif action == GridAction.CLIMB:
+            if (code >> self.boxes_offset) & monkey_bit:
+                code |= 1
+
+        elif action == GridAction.GO_DOWN:
+            code &= ~1
+
+        elif action in MOVES:
+            if not code & 1:
+                target = self.neighbors[MOVES.index(action)][monkey_cell]
+                if target >= 0:
+                    code ^= (monkey_cell ^ target) << 1
+
+        elif action in PUSHES:
+            target = self.neighbors[PUSHES.index(action)][monkey_cell]
+            boxes = code >> self.boxes_offset
+            if not code & 1 and boxes & monkey_bit and target >= 0 and not boxes & (1 << target):
+                code ^= (monkey_bit | (1 << target)) << self.boxes_offset
+                code ^= (monkey_cell ^ target) << 1
+
+        else:
+            return code, 0, False
+
+        return code, -ACTION_PENALTY, False
+
+
+    def successors(self, code: int):
+        """
+        Returns the (action, next code, reward, done) of every available action.
+        """
+        return [(action, *self.step(code, action)) for action in self.available_actions_of(code)]
+
+
+    def available_actions(self):
+        return self.available_actions_of(self.state.code)
+
+
+    def perform_action(self, action: GridAction):
+        code, self.last_reward, done = self.step(self.state.code, action)
+        self.state = GridState(code)
+        self.score += self.last_reward
+        return done
+
+
+    def perceive(self):
+        return self.state
+
+
+    def performance(self):
+        return self.score
+
+
+    def snapshot(self):
+        return (self.state, self.score)
+
+
+    def restore(self, token: tuple):
+        self.state, self.score = token
+
+
+    def visualize(self, renderer: Renderer = None):
+        """
+        Prints the room, with the fruits hanging from the ceiling (or the
+        monkey on its box) on the first line of each row and the floor on the
+        second. A Renderer can instead discard, buffer or record the frames,
+        see rendering.
+        """
+        if renderer is None:
+            print(self.render_frame(self.state), end='')
+        else:
+            renderer.render_with(self.render_frame, self.state)
+
+
+    def render_frame(self, state: GridState):
+        """
+        Returns the text of the frame of the given state, as printed by
+        visualize.
+        """
+        monkey_cell, is_monkey_up, boxes, bananas, oranges = self.decode(state.code)
+
+        lines = ['┌' + '─' * self.width * 2 + '┐']
+        for y in range(self.height):
+            ceiling, floor = [], []
+            for cell in range(y * self.width, (y + 1) * self.width):
+                if cell == monkey_cell and is_monkey_up:
+                    ceiling.append('🐒')
+                elif bananas >> cell & 1:
+                    ceiling.append('🍌')
+                elif oranges >> cell & 1:
+                    ceiling.append('🍊')
+                else:
+                    ceiling.append('  ')
+
+                if cell == monkey_cell and not is_monkey_up:
+                    floor.append('🐒')
+                elif boxes >> cell & 1:
+                    floor.append('██')
+                else:
+                    floor.append('  ')
+            lines.append('|' + ''.join(ceiling) + '|')
+            lines.append('|' + ''.join(floor) + '|')
+        lines.append('└' + '─' * self.width * 2 + '┘')
+
+        return '\n\n' + ''.join(f"    {line}\n" for line in lines) + '\n\n'
+
+
+
+def random_grid_environment(width: int, height: int, n_boxes: int, n_bananas: int, n_oranges: int = 0,
+                            rng: np.random.Generator = None):
+    """
+    Returns a GridMonkeyBananaEnvironmentTask with the monkey, boxes and
+    fruits at random cells. Boxes and fruits of the same kind never share a
+    cell.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    n_cells = width * height
+
+    def positions(n):
+        return [(int(cell % width), int(cell // width)) for cell in rng.choice(n_cells, n, replace=False)]
+
+    monkey = positions(1)[0]
+    return GridMonkeyBananaEnvironmentTask(width, height, monkey, positions(n_boxes), positions(n_bananas),
+                                           positions(n_oranges), rng)
@@ -0,0 +1,136 @@
+import numpy as np
+import scipy.sparse as sparse
+import scipy.sparse.linalg as sparse_linalg
+
+from . banana_environment import ACTION_PENALTY, GRAB_BANANA_REWARD
+from . value_iteration import _transitions
+
+
+
+def random_agent_chain(room_size: int, action_penalty: float = ACTION_PENALTY,
+                       grab_reward: float = GRAB_BANANA_REWARD):
+    """
+    Builds the Markov chain followed by the RandomAgent in the fully observable
+    task, which chooses uniformly among the available actions. States are
+    indexed by (box_position, banana_position, is_monkey_up) as in
+    value_iteration, and the chain is absorbed when the banana is grabbed.
+
+    Returns
+    -------
+    transitions : scipy.sparse.csr_matrix
+        Probability of going from a state to another without being absorbed,
+        shape (n_states, n_states).
+    absorption : np.ndarray
+        Probability of grabbing the banana in one step from each state.
+    expected_rewards : np.ndarray
+        Expected reward of one step from each state.
+
+    """
+    next_states, rewards, terminal, available = _transitions(room_size, action_penalty, grab_reward)
+    n_states = next_states.shape[1]
+    probabilities = available / available.sum(axis=0)
+
+    moves = available & ~terminal
+    states = np.broadcast_to(np.arange(n_states), next_states.shape)
+    transitions = sparse.csr_matrix((probabilities[moves], (states[moves], next_states[moves])),
+                                    shape=(n_states, n_states))
+
+    absorption = (probabilities * terminal).sum(axis=0)
+    expected_rewards = (probabilities * np.where(available, rewards, 0)).sum(axis=0)
+    return transitions, absorption, expected_rewards
+
+
+
+def random_agent_expectations(room_size: int, action_penalty: float = ACTION_PENALTY,
+                              grab_reward: float = GRAB_BANANA_REWARD):
+    """
+    Computes exactly the expected number of steps, its standard deviation and
+    the expected score of the RandomAgent from every initial state, by solving
+    the linear systems of the absorbing chain.
+
+    Returns
+    -------
+    expected_steps : np.ndarray
+        Expected number of steps, shape (room_size, room_size, 2).
+    std_steps : np.ndarray
+        Standard deviation of the number of steps, same shape.
+    expected_scores : np.ndarray
+        Expected final score, same shape.
+
+    """
+    transitions, _, expected_rewards = random_agent_chain(room_size, action_penalty, grab_reward)
+    n_states = transitions.shape[0]
+    fundamental = (sparse.identity(n_states, format="csc") - transitions).tocsc()
+    solve = sparse_linalg.factorized(fundamental)
+
+    # t = 1 + Q t, and for the second moment s = 1 + Q (2 t + s)
+    expected_steps = solve(np.ones(n_states))
+    second_moment = solve(1 + 2 * (transitions @ expected_steps))
+    expected_scores = solve(expected_rewards)
+
+    shape = (room_size, room_size, 2)
+    std_steps = np.sqrt(np.maximum(second_moment - expected_steps ** 2, 0))
+    return expected_steps.reshape(shape), std_steps.reshape(shape), expected_scores.reshape(shape)
+
+
+
+def random_agent_step_distribution(room_size: int, initial_banana_position: int, initial_box_position: int,
+                                   tolerance: float = 1e-12, max_steps: int = None):
+    """
+    Computes the distribution of the number of steps of the RandomAgent from
+    the given initial state, by propagating the distribution over the states
+    until the probability of not being absorbed is below tolerance.
+
+    Returns
+    -------
+    probabilities : np.ndarray
+        probabilities[k] is the probability of grabbing the banana at step k.
+
+    """
+    transitions, absorption, _ = random_agent_chain(room_size)
+    transposed = transitions.T.tocsr()
+
+    distribution = np.zeros(transitions.shape[0])
+    distribution[np.ravel_multi_index((initial_box_position, initial_banana_position, 0),
+                                      (room_size, room_size, 2))] = 1
+    probabilities = [0.]
+
+    while distribution.sum() > tolerance and (max_steps is None or len(probabilities) <= max_steps):
+        probabilities.append(distribution @ absorption)
+        distribution = transposed @ distribution
+
+    return np.array(probabilities)
+
+
+
+def random_agent_score_distribution(room_size: int, initial_banana_position: int, initial_box_position: int,
+                                    action_penalty: float = ACTION_PENALTY, grab_reward: float = GRAB_BANANA_REWARD,
+                                    tolerance: float = 1e-12, max_steps: int = None):
+    """
+    Computes the distribution of the final score of the RandomAgent from the
+    given initial state. Every action but the final grab costs action_penalty.
+
+    Returns
+    -------
+    scores : np.ndarray
+        Possible final scores, in decreasing order.
+    probabilities : np.ndarray
+        Probability of each score.
+
+    """
+    probabilities = random_agent_step_distribution(room_size, initial_banana_position, initial_box_position,
+                                                   tolerance, max_steps)
+    steps = np.arange(1, len(probabilities))
+    return grab_reward - action_penalty * (steps - 1), probabilities[1:]
+
+
+
+def optimal_run_probability(room_size: int, initial_banana_position: int, initial_box_position: int):
+    """
+    Returns the probability that the RandomAgent follows an optimal trajectory,
+    i.e. grabs the banana in the minimal number of steps.
+    """
+    optimal_steps = abs(initial_banana_position - initial_box_position) + 2
+    probabilities = random_agent_step_distribution(room_size, initial_banana_position, initial_box_position,
+                                                   max_steps=optimal_steps)
+    return probabilities[optimal_steps]
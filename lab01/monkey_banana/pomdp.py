@@ -0,0 +1,341 @@
+import numpy as np
+
+from . banana_environment import ACTION_PENALTY, GRAB_BANANA_REWARD
+from . banana_environment import MonkeyBananaAction
+from . batch_environment import MonkeyBananaBatchEnvironment
+from . belief import smell_likelihood_table, update_beliefs
+
+
+
+class PointBasedPolicy:
+    """
+    Policy of the partially observable task given by a set of alpha-vectors for
+    each observed part of the state (box position, monkey up). The value of a
+    belief over the banana position is the maximal dot product with the
+    alpha-vectors, and the chosen action is the one attached to the best
+    alpha-vector.
+    """
+
+    def __init__(self, room_size: int, alphas: list, actions: list):
+        """
+        Parameters
+        ----------
+        room_size : int
+            Size of the room.
+        alphas : list
+            For each observed state box_position * 2 + is_monkey_up, an array
+            of shape (n_vectors, room_size) of alpha-vectors.
+        actions : list
+            For each observed state, the values of the MonkeyBananaAction of
+            the alpha-vectors.
+
+        """
+        self.room_size = room_size
+        self.alphas = alphas
+        self.actions = actions
+
+
+    def value(self, box_position: int, is_monkey_up: bool, beliefs: np.ndarray):
+        return np.max(self.alphas[box_position * 2 + int(is_monkey_up)] @ beliefs)
+
+
+    def action(self, box_position: int, is_monkey_up: bool, beliefs: np.ndarray):
+        observed_state = box_position * 2 + int(is_monkey_up)
+        best = np.argmax(self.alphas[observed_state] @ beliefs)
+        return MonkeyBananaAction(int(self.actions[observed_state][best]))
+
+
+    def save(self, path: str):
+        sizes = np.array([len(a) for a in self.actions])
+        np.savez(path, room_size=self.room_size, sizes=sizes,
+                 alphas=np.concatenate(self.alphas), actions=np.concatenate(self.actions))
+
+
+    @staticmethod
+    def load(path: str):
+        data = np.load(path)
+        splits = np.cumsum(data["sizes"])[:-1]
+        return PointBasedPolicy(int(data["room_size"]),
+                                np.split(data["alphas"], splits),
+                                np.split(data["actions"], splits))
+
+
+
+def _observed_model(room_size: int, action_penalty: float, grab_reward: float):
+    """
+    Builds the model of the partially observable task, where the observed part
+    of the state is box_position * 2 + is_monkey_up and the hidden part is the
+    banana position.
+
+    Returns
+    -------
+    model : dict
+        For each observed state, the list of (action, next observed state,
+        reward vector, continuation vector) of the available actions. The
+        vectors are indexed by the banana position, and the continuation is 0
+        where the action ends the episode.
+    observation_likelihoods : np.ndarray
+        Array of shape (n_observed_states, 2, room_size) giving the
+        probability of not smelling / smelling the banana when arriving in an
+        observed state.
+
+    """
+    likelihoods = smell_likelihood_table(room_size)
+    n_observed_states = room_size * 2
+    banana_positions = np.arange(room_size)
+
+    observation_likelihoods = np.zeros((n_observed_states, 2, room_size))
+    model = {}
+
+    for observed_state in range(n_observed_states):
+        box_position, up = divmod(observed_state, 2)
+
+        if up:
+            observation_likelihoods[observed_state] = likelihoods[:, box_position]
+            available_actions = [MonkeyBananaAction.GO_DOWN, MonkeyBananaAction.GRAB]
+        else:
+            # The monkey cannot smell anything from the ground
+            observation_likelihoods[observed_state, 0] = 1
+            available_actions = [MonkeyBananaAction.MOVE_BOX_LEFT, MonkeyBananaAction.MOVE_BOX_RIGHT,
+                                 MonkeyBananaAction.GRAB, MonkeyBananaAction.CLIMB]
+
+        model[observed_state] = []
+        for action in available_actions:
+            next_box_position, next_up = box_position, up
+            rewards = np.full(room_size, -action_penalty)
+            continuation = np.ones(room_size)
+
+            if action == MonkeyBananaAction.GRAB and up:
+                victory = banana_positions == box_position
+                rewards[victory] = grab_reward
+                continuation[victory] = 0
+            elif action == MonkeyBananaAction.CLIMB:
+                next_up = 1
+            elif action == MonkeyBananaAction.GO_DOWN:
+                next_up = 0
+            elif action == MonkeyBananaAction.MOVE_BOX_LEFT:
+                next_box_position = max(box_position - 1, 0)
+            elif action == MonkeyBananaAction.MOVE_BOX_RIGHT:
+                next_box_position = min(box_position + 1, room_size - 1)
+
+            model[observed_state].append((action.value, next_box_position * 2 + next_up, rewards, continuation))
+
+    return model, observation_likelihoods
+
+
+
+def sample_beliefs(room_size: int, n_beliefs: int, rng: np.random.Generator = None, horizon: int = None,
+                   policy: PointBasedPolicy = None, epsilon: float = 0.1):
+    """
+    Samples beliefs reachable by agents acting at random, or following the
+    given policy with probability 1 - epsilon, to be used as belief points by
+    point_based_value_iteration.
+
+    Parameters
+    ----------
+    room_size : int
+        Size of the room.
+    n_beliefs : int
+        Number of sampled beliefs.
+    rng : np.random.Generator, optional
+        Random generator. The default is a fresh unseeded generator.
+    horizon : int, optional
+        Length of the simulated episodes. The default is 4 * room_size.
+    policy : PointBasedPolicy, optional
+        Policy followed by the agents. The default is to act at random.
+    epsilon : float, optional
+        Probability of a random action when following a policy. The default
+        is 0.1.
+
+    Returns
+    -------
+    observed_states : np.ndarray
+        Observed states box_position * 2 + is_monkey_up in which the beliefs
+        were reached.
+    beliefs : np.ndarray
+        Array of shape (n_beliefs, room_size), or less if the agents did not
+        reach enough beliefs.
+
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    if horizon is None:
+        horizon = 4 * room_size
+
+    likelihoods = smell_likelihood_table(room_size)
+    n_walkers = max(n_beliefs // 10, 1)
+    env = MonkeyBananaBatchEnvironment(rng.integers(0, room_size, n_walkers), rng.integers(0, room_size, n_walkers), room_size)
+    beliefs = np.full((n_walkers, room_size), 1 / room_size)
+    samples, sample_states = [], []
+
+    for _ in range(horizon):
+        running = ~env.done
+        actions = env.sample_random_actions(rng)
+
+        if policy is not None:
+            observed_states = env.box_positions * 2 + env.is_monkey_up
+            greedy = rng.random(n_walkers) >= epsilon
+            for observed_state in np.unique(observed_states[greedy]):
+                walkers = greedy & (observed_states == observed_state)
+                best = np.argmax(beliefs[walkers] @ policy.alphas[observed_state].T, axis=1)
+                actions[walkers] = policy.actions[observed_state][best]
+
+        grab_up = (actions == MonkeyBananaAction.GRAB.value) & env.is_monkey_up
+        done = env.perform_actions(actions)
+
+        # A grab on the box which did not end the episode means that the
+        # banana is elsewhere
+        failed = grab_up & running & ~done
+        beliefs[failed, env.box_positions[failed]] = 0
+        beliefs[failed] /= beliefs[failed].sum(axis=1, keepdims=True)
+
+        beliefs = update_beliefs(beliefs, env.box_positions, env.is_monkey_up, env.smell_banana(rng), likelihoods)
+        samples.append(beliefs[~done])
+        sample_states.append((env.box_positions * 2 + env.is_monkey_up)[~done])
+
+    samples = np.column_stack((np.concatenate(sample_states), np.round(np.concatenate(samples), 6)))
+    samples = np.unique(samples, axis=0)
+    samples = samples[rng.choice(len(samples), min(n_beliefs, len(samples)), replace=False)]
+    return samples[:, 0].astype(np.int64), samples[:, 1:]
+
+
+
+def _backup(alphas: list, actions: list, beliefs: list, model: dict, observation_likelihoods: np.ndarray,
+            gamma: float):
+    """
+    Point-based backup of the alpha-vectors of every observed state at its
+    belief points, done for all the points of a state at once as matrix
+    products.
+
+    Returns
+    -------
+    alphas : list
+        New alpha-vectors of each observed state.
+    actions : list
+        Values of the MonkeyBananaAction of the new alpha-vectors.
+    values : list
+        Values of the belief points of each observed state.
+
+    """
+    new_alphas, new_actions, values = [], [], []
+    all_beliefs = beliefs
+    projection = np.random.default_rng(0).random(all_beliefs[0].shape[1])
+
+    for observed_state in range(len(alphas)):
+        beliefs = all_beliefs[observed_state]
+        best_values = np.full(len(beliefs), -np.inf)
+        best_alphas = np.empty_like(beliefs)
+        best_actions = np.empty(len(beliefs), dtype=np.int64)
+
+        for action, next_observed_state, rewards, continuation in model[observed_state]:
+            backup = np.broadcast_to(rewards, beliefs.shape).copy()
+
+            for smells in (0, 1):
+                weights = observation_likelihoods[next_observed_state, smells] * continuation
+                if not weights.any():
+                    continue
+                projected = alphas[next_observed_state] * weights
+                best = np.argmax(beliefs @ projected.T, axis=1)
+                backup += gamma * projected[best]
+
+            backup_values = np.einsum("ij,ij->i", backup, beliefs)
+            better = backup_values > best_values
+            best_values[better] = backup_values[better]
+            best_alphas[better] = backup[better]
+            best_actions[better] = action
+
+        # As in Perseus, points whose value would decrease keep their previous
+        # alpha-vector, so that the values only increase
+        previous = beliefs @ alphas[observed_state].T
+        previous_best = np.argmax(previous, axis=1)
+        previous_values = previous[np.arange(len(beliefs)), previous_best]
+        worse = best_values < previous_values
+        best_values[worse] = previous_values[worse]
+        best_alphas[worse] = alphas[observed_state][previous_best[worse]]
+        best_actions[worse] = actions[observed_state][previous_best[worse]]
+
+        # Duplicated alpha-vectors are removed by comparing random projections
+        _, index = np.unique(best_alphas @ projection, return_index=True)
+        new_alphas.append(best_alphas[index])
+        new_actions.append(best_actions[index])
+        values.append(best_values)
+
+    return new_alphas, new_actions, values
+
+
+
+def point_based_value_iteration(room_size: int, n_beliefs: int = 1000, n_expansions: int = 8, gamma: float = 0.95,
+                                action_penalty: float = ACTION_PENALTY, grab_reward: float = GRAB_BANANA_REWARD,
+                                tolerance: float = 1e-3, max_iterations: int = 1000,
+                                rng: np.random.Generator = None):
+    """
+    Point-based value iteration (PBVI) for the partially observable task. The
+    value function of each observed state is backed up at a set of belief
+    points. The points are first sampled with random agents, then the sets
+    are expanded with the beliefs reached by the current policy, as in
+    Perseus.
+
+    Parameters
+    ----------
+    room_size : int
+        Size of the room.
+    n_beliefs : int, optional
+        Number of belief points sampled at each expansion, see sample_beliefs.
+        The default is 1000.
+    n_expansions : int, optional
+        Number of expansions of the set of belief points. The default is 8.
+    gamma : float, optional
+        Discount factor. The default is 0.95.
+    action_penalty : float, optional
+        Penalty of every action but the successful grab. The default is
+        ACTION_PENALTY.
+    grab_reward : float, optional
+        Reward for grabbing the banana. The default is GRAB_BANANA_REWARD.
+    tolerance : float, optional
+        The backups stop once the values at the belief points change by less
+        than this. The default is 1e-3.
+    max_iterations : int, optional
+        Maximal number of backups between two expansions. The default is 1000.
+    rng : np.random.Generator, optional
+        Random generator used to sample the belief points.
+
+    Returns
+    -------
+    policy : PointBasedPolicy
+        Policy given by the computed alpha-vectors.
+
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    model, observation_likelihoods = _observed_model(room_size, action_penalty, grab_reward)
+    n_observed_states = room_size * 2
+
+    # The uniform belief and the beliefs certain of the banana position are
+    # always included
+    initial_beliefs = np.concatenate((np.full((1, room_size), 1 / room_size), np.eye(room_size)))
+    beliefs = [initial_beliefs for _ in range(n_observed_states)]
+    sampled_states, sampled_beliefs = sample_beliefs(room_size, n_beliefs, rng)
+
+    # Lower bound: paying the penalty forever
+    lower_bound = -action_penalty / (1 - gamma) if action_penalty > 0 else 0
+    alphas = [np.full((1, room_size), lower_bound) for _ in range(n_observed_states)]
+    actions = [np.array([MonkeyBananaAction.GRAB.value]) for _ in range(n_observed_states)]
+
+    for expansion in range(n_expansions + 1):
+        beliefs = [np.concatenate((beliefs[observed_state], sampled_beliefs[sampled_states == observed_state]))
+                   for observed_state in range(n_observed_states)]
+        values = [np.full(len(b), -np.inf) for b in beliefs]
+
+        for _ in range(max_iterations):
+            alphas, actions, new_values = _backup(alphas, actions, beliefs, model, observation_likelihoods, gamma)
+            converged = max(np.max(np.abs(new - old)) for new, old in zip(new_values, values)) < tolerance
+            values = new_values
+            if converged:
+                break
+
+        if expansion < n_expansions:
+            policy = PointBasedPolicy(room_size, alphas, actions)
+            sampled_states, sampled_beliefs = sample_beliefs(room_size, n_beliefs, rng, policy=policy)
+
+    return PointBasedPolicy(room_size, alphas, actions)
@@ -0,0 +1,174 @@
+from functools import lru_cache
+import sys
+
+
+
+@lru_cache(maxsize=4096)
+def render_frame(state: "MonkeyBananaState", room_size: int):
+    """
+    Returns the text of the frame of the given state, as printed by
+    MonkeyBananaEnvironmentTask.visualize. Frames are cached since states are
+    immutable.
+    """
+    level_2 = [" "] * (room_size * 2 - 1)
+    level_2[state.banana_position * 2] = '🍌'
+
+    if state.is_monkey_up:
+        level_1 = [" "] * (room_size * 2 - 1)
+        level_1[state.box_position * 2] = '🐒'
+        level_0 = [" "] * (room_size * 2 - 1)
+        level_0[state.box_position * 2] = '██'
+    else:
+        level_1 = [" "] * (room_size * 2)
+        level_0 = [" "] * (room_size * 2 - 2)
+        level_0[max(state.box_position * 2 - 1, 0)] = '██'
+        level_0[1 if state.box_position == 0 else 0] = '🐒'
+
+    lines = [
+        '┌' + "─" * room_size * 2 + '┐',
+        '|' + ''.join(level_2) + '|',
+        '|' + ''.join(level_1) + '|',
+        '|' + ''.join(level_0) + '|',
+        '└' + '─' * room_size * 2 + '┘',
+    ]
+    return '\n\n' + ''.join(f"    {line}\n" for line in lines) + '\n\n'
+
+
+
+class Renderer:
+    """
+    Renders the frames and logs of a run to the standard output, frame by
+    frame.
+    """
+
+    def render(self, state: "MonkeyBananaState", room_size: int):
+        self.render_with(render_frame, state, room_size)
+
+
+    def render_with(self, frame, *args):
+        """
+        Renders the frame whose text is returned by frame(*args), e.g. by
+        GridMonkeyBananaEnvironmentTask.render_frame for the grid
+        environment.
+        """
+        sys.stdout.write(frame(*args))
+
+
+    def write(self, *values):
+        """
+        Writes a log line, with the same formatting as print.
+        """
+        print(*values)
+
+
+    def flush(self):
+        pass
+
+
+
+class HeadlessRenderer(Renderer):
+    """
+    Renderer which discards everything, for runs without any output.
+    """
+
+    def render_with(self, frame, *args):
+        pass
+
+
+    def write(self, *values):
+        pass
+
+
+
+class BufferedRenderer(Renderer):
+    """
+    Renderer which accumulates the text of the frames and logs, and writes it
+    to file in bulk every time buffer_size characters are buffered, and when
+    flushed.
+
+    Parameters
+    ----------
+    file : file object, optional
+        Text file to write to. The default is the standard output.
+    buffer_size : int, optional
+        Number of characters buffered before writing. The default is 2**20.
+
+    """
+
+    def __init__(self, file=None, buffer_size: int = 2 ** 20):
+        self.file = file
+        self.buffer_size = buffer_size
+        # The frames are cached strings, so the buffer only holds references
+        self.buffer = []
+        self.buffered_size = 0
+
+
+    def _append(self, text: str):
+        self.buffer.append(text)
+        self.buffered_size += len(text)
+        if self.buffered_size >= self.buffer_size:
+            self.flush()
+
+
+    def render_with(self, frame, *args):
+        self._append(frame(*args))
+
+
+    def write(self, *values):
+        self._append(' '.join(map(str, values)) + '\n')
+
+
+    def flush(self):
+        file = sys.stdout if self.file is None else self.file
+        file.write(''.join(self.buffer))
+        file.flush()
+        self.buffer.clear()
+        self.buffered_size = 0
+
+
+
+class FrameRecorder(Renderer):
+    """
+    Renderer which only stores the states of the frames, and renders them
+    lazily on replay. Logs are discarded.
+    """
+
+    def __init__(self):
+        # Function and arguments of each frame, see Renderer.render_with
+        self.calls = []
+
+
+    @property
+    def states(self):
+        """
+        Arguments of the recorded frames, (state, room_size) for the 1-D
+        environment.
+        """
+        return [args for _, args in self.calls]
+
+
+    def render_with(self, frame, *args):
+        self.calls.append((frame, args))
+
+
+    def write(self, *values):
+        pass
+
+
+    def frames(self):
+        """
+        Yields the text of the recorded frames.
+        """
+        for frame, args in self.calls:
+            yield frame(*args)
+
+
+    def replay(self, renderer: Renderer = None):
+        """
+        Renders the recorded frames with renderer. The default is to render
+        them to the standard output.
+        """
+        renderer = Renderer() if renderer is None else renderer
+        for frame, args in self.calls:
+            renderer.render_with(frame, *args)
+        renderer.flush()
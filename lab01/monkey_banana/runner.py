@@ -0,0 +1,153 @@
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import os
+import numpy as np
+
+from . statistics import EpisodeStatistics
+
+
+
+def run_episode(env, agent, max_steps: int = None):
+    """
+    Runs the agent in the environment until the banana is grabbed.
+
+    Returns
+    -------
+    steps : int
+        Number of actions performed.
+    score : float
+        Final score.
+    done : bool
+        Whether the banana was grabbed within max_steps.
+
+    """
+    steps = 0
+    done = False
+    while not done and (max_steps is None or steps < max_steps):
+        done = env.perform_action(agent.choose_action(env))
+        steps += 1
+    return steps, env.score, done
+
+
+
+def run_chunk(env_factory, agent_factory, seed_sequence: np.random.SeedSequence, n_episodes: int,
+              max_steps: int = None, statistics_factory=EpisodeStatistics):
+    """
+    Runs n_episodes episodes with a generator seeded by seed_sequence, which is
+    injected into each new agent and environment.
+
+    Parameters
+    ----------
+    env_factory : callable
+        Returns a new environment. Must be picklable, e.g. a class or a
+        functools.partial of a class.
+    agent_factory : callable
+        Returns a new agent. Must be picklable.
+    seed_sequence : np.random.SeedSequence
+        Seed of the chunk.
+    n_episodes : int
+        Number of episodes.
+    max_steps : int, optional
+        Maximal number of steps per episode. The default is no limit.
+    statistics_factory : callable, optional
+        Returns new empty statistics. The default is EpisodeStatistics.
+
+    Returns
+    -------
+    statistics : EpisodeStatistics
+        Statistics of the episodes.
+
+    """
+    rng = np.random.default_rng(seed_sequence)
+    steps = np.empty(n_episodes, dtype=np.int64)
+    scores = np.empty(n_episodes)
+    done = np.empty(n_episodes, dtype=bool)
+
+    for i in range(n_episodes):
+        env = env_factory()
+        agent = agent_factory()
+        env.rng = rng
+        agent.rng = rng
+        steps[i], scores[i], done[i] = run_episode(env, agent, max_steps)
+
+    statistics = statistics_factory()
+    statistics.update(steps, scores, done)
+    return statistics
+
+
+
+def run_episodes(env_factory, agent_factory, n_episodes: int, seed: int = None, n_workers: int = None,
+                 chunk_size: int = 1000, max_steps: int = None, statistics_factory=EpisodeStatistics):
+    """
+    Runs many episodes over a pool of processes. The episodes are split in
+    chunks of chunk_size episodes, each with its own generator spawned from
+    seed, and the statistics of the chunks are merged in chunk order as they
+    arrive. The result therefore only depends on seed and chunk_size, not on
+    the number of workers or on the scheduling.
+
+    Parameters
+    ----------
+    env_factory : callable
+        Returns a new environment. Must be picklable, e.g. a class or a
+        functools.partial of a class.
+    agent_factory : callable
+        Returns a new agent. Must be picklable.
+    n_episodes : int
+        Number of episodes.
+    seed : int, optional
+        Seed of the study. The default is a random seed.
+    n_workers : int, optional
+        Number of processes. The default is the number of CPUs. With a single
+        worker, the chunks are run in the current process.
+    chunk_size : int, optional
+        Number of episodes per chunk. The default is 1000.
+    max_steps : int, optional
+        Maximal number of steps per episode. The default is no limit.
+    statistics_factory : callable, optional
+        Returns new empty statistics, e.g. a functools.partial of
+        EpisodeStatistics with other bins. The default is EpisodeStatistics.
+
+    Returns
+    -------
+    statistics : EpisodeStatistics
+        Statistics of all the episodes.
+
+    """
+    if n_workers is None:
+        n_workers = os.cpu_count()
+
+    n_chunks = -(-n_episodes // chunk_size)
+    seed_sequences = np.random.SeedSequence(seed).spawn(n_chunks)
+    chunk_sizes = [min(chunk_size, n_episodes - i * chunk_size) for i in range(n_chunks)]
+    statistics = statistics_factory()
+
+    if n_workers == 1:
+        for seed_sequence, size in zip(seed_sequences, chunk_sizes):
+            statistics.merge(run_chunk(env_factory, agent_factory, seed_sequence, size, max_steps,
+                                        statistics_factory))
+        return statistics
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        # Only a bounded number of chunks is submitted at once, and the
+        # finished ones are merged in order, so that the memory stays constant
+        running = {}
+        finished = {}
+        next_chunk = 0
+        next_merge = 0
+
+        while next_merge < n_chunks:
+            while next_chunk < n_chunks and len(running) + len(finished) < 2 * n_workers:
+                future = executor.submit(run_chunk, env_factory, agent_factory,
+                                         seed_sequences[next_chunk], chunk_sizes[next_chunk], max_steps,
+                                         statistics_factory)
+                running[future] = next_chunk
+                next_chunk += 1
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                finished[running.pop(future)] = future.result()
+
+            while next_merge in finished:
+                statistics.merge(finished.pop(next_merge))
+                next_merge += 1
+
+    return statistics
@@ -0,0 +1,245 @@
+import math
+import numpy as np
+
+
+
+class RunningMoments:
+    """
+    Count, mean, variance, minimum and maximum of a stream of values, updated
+    in constant memory (Welford / Chan et al. algorithm).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.
+        self.m2 = 0.
+        self.min = math.inf
+        self.max = -math.inf
+
+
+    def _combine(self, count: int, mean: float, m2: float):
+        total = self.count + count
+        if total == 0:
+            return
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+
+
+    def update(self, values):
+        """
+        Adds one value or an array of values.
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size == 0:
+            return
+        mean = values.mean()
+        self._combine(values.size, mean, ((values - mean) ** 2).sum())
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+
+    def merge(self, other: "RunningMoments"):
+        self._combine(other.count, other.mean, other.m2)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+
+    def variance(self):
+        """
+        Unbiased variance of the values.
+        """
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.
+
+
+    def std(self):
+        return math.sqrt(self.variance())
+
+
+
+class Histogram:
+    """
+    Histogram with n_bins bins of equal width between low and high. Values
+    outside of the range are counted in underflow and overflow.
+    """
+
+    def __init__(self, low: float, high: float, n_bins: int):
+        self.low = low
+        self.high = high
+        self.n_bins = n_bins
+        self.counts = np.zeros(n_bins, dtype=np.int64)
+        self.underflow = 0
+        self.overflow = 0
+
+
+    @property
+    def bin_edges(self):
+        return np.linspace(self.low, self.high, self.n_bins + 1)
+
+
+    def update(self, values):
+        """
+        Adds one value or an array of values.
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        below = values < self.low
+        above = values >= self.high
+        self.underflow += np.count_nonzero(below)
+        self.overflow += np.count_nonzero(above)
+
+        inside = values[~(below | above)]
+        bins = ((inside - self.low) * (self.n_bins / (self.high - self.low))).astype(np.int64)
+        # Rounding can put values just below high in the bin n_bins
+        np.minimum(bins, self.n_bins - 1, out=bins)
+        self.counts += np.bincount(bins, minlength=self.n_bins)
+
+
+    def merge(self, other: "Histogram"):
+        assert (self.low, self.high, self.n_bins) == (other.low, other.high, other.n_bins), \
+            "Histograms must have the same bins to be merged"
+        self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        return self
+
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with a relative accuracy guarantee (DDSketch).
+    Values are counted in logarithmic buckets, so that any quantile is returned
+    within relative_accuracy of its exact value, and the number of buckets only
+    grows with the logarithm of the range of the values.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+        self.count = 0
+
+
+    def _add(self, store: dict, magnitudes: np.ndarray):
+        keys, counts = np.unique(np.ceil(np.log(magnitudes) / self.log_gamma).astype(np.int64), return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            store[key] = store.get(key, 0) + count
+
+
+    def update(self, values):
+        """
+        Adds one value or an array of values.
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        self.count += values.size
+        self.zero_count += np.count_nonzero(values == 0)
+        self._add(self.positive, values[values > 0])
+        self._add(self.negative, -values[values < 0])
+
+
+    def merge(self, other: "QuantileSketch"):
+        assert self.relative_accuracy == other.relative_accuracy, \
+            "Sketches must have the same accuracy to be merged"
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        return self
+
+
+    def _value(self, key: int):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+
+    def quantile(self, q: float):
+        """
+        Returns an estimation of the q-quantile of the values, with 0 <= q <= 1.
+        """
+        if self.count == 0:
+            return math.nan
+
+        negative_keys = sorted(self.negative, reverse=True)
+        positive_keys = sorted(self.positive)
+        values = [-self._value(key) for key in negative_keys] + [0.] + [self._value(key) for key in positive_keys]
+        counts = [self.negative[key] for key in negative_keys] + [self.zero_count] + \
+                 [self.positive[key] for key in positive_keys]
+
+        rank = q * (self.count - 1)
+        return values[np.searchsorted(np.cumsum(counts), rank, side="right")]
+
+
+
+class EpisodeStatistics:
+    """
+    Statistics of the steps and scores of many episodes in constant memory:
+    running mean and variance, histogram of the steps, quantile sketches and
+    number of optimal and unfinished episodes. Statistics computed on
+    different workers can be merged.
+
+    Parameters
+    ----------
+    max_steps_bin : int, optional
+        The histogram of the steps has one bin per number of steps up to
+        max_steps_bin, larger numbers are counted in its overflow. The default
+        is 1000.
+    relative_accuracy : float, optional
+        Relative accuracy of the quantiles. The default is 0.01.
+    optimal_score : float, optional
+        Score of an optimal episode. The default (None) is not to count them.
+
+    """
+
+    def __init__(self, max_steps_bin: int = 1000, relative_accuracy: float = 0.01, optimal_score: float = None):
+        self.optimal_score = optimal_score
+        self.steps = RunningMoments()
+        self.scores = RunningMoments()
+        self.steps_histogram = Histogram(0, max_steps_bin, max_steps_bin)
+        self.steps_sketch = QuantileSketch(relative_accuracy)
+        self.scores_sketch = QuantileSketch(relative_accuracy)
+        self.optimal = 0
+        self.unfinished = 0
+
+
+    @property
+    def episodes(self):
+        return self.steps.count
+
+
+    def update(self, steps, scores, done=True):
+        """
+        Adds one episode or arrays of episodes.
+
+        Parameters
+        ----------
+        steps : int or np.ndarray
+            Number of steps of the episodes.
+        scores : float or np.ndarray
+            Final scores of the episodes.
+        done : bool or np.ndarray, optional
+            Whether the episodes ended. The default is True.
+
+        """
+        self.steps.update(steps)
+        self.scores.update(scores)
+        self.steps_histogram.update(steps)
+        self.steps_sketch.update(steps)
+        self.scores_sketch.update(scores)
+        self.unfinished += np.size(steps) - np.count_nonzero(np.broadcast_to(done, np.shape(steps)))
+        if self.optimal_score is not None:
+            self.optimal += np.count_nonzero(np.isclose(scores, self.optimal_score))
+
+
+    def merge(self, other: "EpisodeStatistics"):
+        self.steps.merge(other.steps)
+        self.scores.merge(other.scores)
+        self.steps_histogram.merge(other.steps_histogram)
+        self.steps_sketch.merge(other.steps_sketch)
+        self.scores_sketch.merge(other.scores_sketch)
+        self.optimal += other.optimal
+        self.unfinished += other.unfinished
+        return self
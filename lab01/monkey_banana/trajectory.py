@@ -0,0 +1,127 @@
+from array import array
+import os
+import numpy as np
+
+from . banana_environment import MonkeyBananaState, MonkeyBananaAction
+
+
+
+class Trajectories:
+    """
+    Transitions of several episodes stored in flat arrays. Episode i is made of
+    the transitions episode_starts[i] to episode_starts[i + 1] (excluded).
+
+    Parameters
+    ----------
+    states : np.ndarray
+        Packed state (see MonkeyBananaState.pack or GridState.pack) before
+        each action, int64.
+    actions : np.ndarray
+        Value of each action, int8.
+    rewards : np.ndarray
+        Reward of each action, float64.
+    episode_starts : np.ndarray
+        Index of the first transition of each episode, int64.
+
+    """
+
+    FILES = ("states", "actions", "rewards", "episode_starts")
+
+    def __init__(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray, episode_starts: np.ndarray):
+        self.states = states
+        self.actions = actions
+        self.rewards = rewards
+        self.episode_starts = episode_starts
+
+
+    def __len__(self):
+        return len(self.episode_starts)
+
+
+    def episode(self, i: int):
+        """
+        Returns the (states, actions, rewards) arrays of episode i.
+        """
+        start = self.episode_starts[i]
+        end = self.episode_starts[i + 1] if i + 1 < len(self.episode_starts) else len(self.states)
+        return self.states[start:end], self.actions[start:end], self.rewards[start:end]
+
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.episode(i)
+
+
+    def replay(self, i: int, state_type: type = MonkeyBananaState, action_type: type = MonkeyBananaAction):
+        """
+        Yields the (state, action, reward) transitions of episode i, without
+        simulating it again. The states are unpacked with state_type.unpack
+        and the actions built by action_type, e.g. GridState and GridAction
+        for the grid environment.
+        """
+        for state, action, reward in zip(*self.episode(i)):
+            yield state_type.unpack(int(state)), action_type(int(action)), float(reward)
+
+
+    def save(self, directory: str):
+        """
+        Saves the arrays as .npy files in directory.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in self.FILES:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True):
+        """
+        Loads trajectories saved with save. With mmap, the arrays are memory
+        mapped read-only instead of being read in memory.
+        """
+        mmap_mode = "r" if mmap else None
+        return cls(*(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode) for name in cls.FILES))
+
+
+
+class TrajectoryRecorder:
+    """
+    Records the transitions of episodes in growable typed arrays, without one
+    Python object per transition.
+    """
+
+    def __init__(self):
+        self.states = array('q')
+        self.actions = array('b')
+        self.rewards = array('d')
+        self.episode_starts = array('q')
+
+
+    def __len__(self):
+        return len(self.states)
+
+
+    def start_episode(self):
+        self.episode_starts.append(len(self.states))
+
+
+    def record(self, state, action, reward: float):
+        """
+        Appends a transition to the current episode. The state must have a
+        pack method and the action an integer value.
+        """
+        self.states.append(state.pack())
+        self.actions.append(action.value)
+        self.rewards.append(reward)
+
+
+    def trajectories(self):
+        """
+        Returns a copy of the recorded Trajectories. The arrays are copied
+        since a typed array cannot grow while NumPy views its memory.
+        """
+        return Trajectories(*(np.frombuffer(getattr(self, name), dtype=dtype).copy()
+                              for name, dtype in zip(Trajectories.FILES, (np.int64, np.int8, np.float64, np.int64))))
+
+
+    def save(self, directory: str):
+        self.trajectories().save(directory)
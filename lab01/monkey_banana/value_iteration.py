@@ -0,0 +1,166 @@
+import os
+import numpy as np
+
+from . banana_environment import ACTION_PENALTY, GRAB_BANANA_REWARD
+from . banana_environment import MonkeyBananaAction
+
+
+
+def _transitions(room_size: int, action_penalty: float, grab_reward: float):
+    """
+    Builds the transitions of the fully observable task for all the states at
+    once. States are indexed by (box_position, banana_position, is_monkey_up).
+
+    Returns
+    -------
+    next_states : np.ndarray
+        Flat index of the next state, shape (n_actions, n_states).
+    rewards : np.ndarray
+        Reward of each transition, shape (n_actions, n_states).
+    terminal : np.ndarray
+        Whether the transition ends the episode, shape (n_actions, n_states).
+    available : np.ndarray
+        Whether the action is available, shape (n_actions, n_states).
+
+    """
+    shape = (room_size, room_size, 2)
+    box, banana, up = (x.ravel() for x in np.indices(shape))
+    up = up.astype(bool)
+    n_actions = len(MonkeyBananaAction)
+
+    next_states = np.empty((n_actions, box.size), dtype=np.int64)
+    rewards = np.full((n_actions, box.size), -action_penalty)
+    terminal = np.zeros((n_actions, box.size), dtype=bool)
+    available = np.zeros((n_actions, box.size), dtype=bool)
+
+    for action in MonkeyBananaAction:
+        next_box, next_up = box, up
+
+        if action == MonkeyBananaAction.GRAB:
+            available[action.value] = True
+            terminal[action.value] = up & (box == banana)
+            rewards[action.value, terminal[action.value]] = grab_reward
+        elif action == MonkeyBananaAction.CLIMB:
+            available[action.value] = ~up
+            next_up = np.ones_like(up)
+        elif action == MonkeyBananaAction.GO_DOWN:
+            available[action.value] = up
+            next_up = np.zeros_like(up)
+        elif action == MonkeyBananaAction.MOVE_BOX_LEFT:
+            available[action.value] = ~up
+            next_box = np.maximum(box - 1, 0)
+        elif action == MonkeyBananaAction.MOVE_BOX_RIGHT:
+            available[action.value] = ~up
+            next_box = np.minimum(box + 1, room_size - 1)
+
+        next_states[action.value] = np.ravel_multi_index((next_box, banana, next_up.astype(np.int64)), shape)
+
+    return next_states, rewards, terminal, available
+
+
+
+def value_iteration(room_size: int, action_penalty: float = ACTION_PENALTY, grab_reward: float = GRAB_BANANA_REWARD,
+                    max_iterations: int = None):
+    """
+    Computes the optimal (undiscounted) values and policy of the fully
+    observable monkey and banana task for every state with value iteration.
+
+    Parameters
+    ----------
+    room_size : int
+        Size of the room.
+    action_penalty : float, optional
+        Penalty of every action but the successful grab. The default is
+        ACTION_PENALTY.
+    grab_reward : float, optional
+        Reward for grabbing the banana. The default is GRAB_BANANA_REWARD.
+    max_iterations : int, optional
+        Maximal number of iterations. The default is no limit.
+
+    Returns
+    -------
+    values : np.ndarray
+        Optimal value of every state, shape (room_size, room_size, 2).
+    policy : np.ndarray
+        Value of the optimal MonkeyBananaAction of every state, shape
+        (room_size, room_size, 2).
+
+    """
+    next_states, rewards, terminal, available = _transitions(room_size, action_penalty, grab_reward)
+    n_states = next_states.shape[1]
+
+    # Predecessors of every state in CSR form, so that each iteration only
+    # updates the states whose successors changed in the previous one
+    flat_next_states = next_states.ravel()
+    order = np.argsort(flat_next_states, kind="stable")
+    predecessors = order % n_states
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(flat_next_states, minlength=n_states))))
+
+    def q_values(states, values):
+        q = np.where(terminal[:, states], rewards[:, states], rewards[:, states] + values[next_states[:, states]])
+        q[~available[:, states]] = -np.inf
+        return q
+
+    # Starting from -inf, the values are exact once they stop changing since
+    # every transition is deterministic
+    values = np.full(n_states, -np.inf)
+    updated = np.arange(n_states)
+
+    n = 0
+    while updated.size > 0 and (max_iterations is None or n < max_iterations):
+        new_values = q_values(updated, values).max(axis=0)
+        changed = updated[new_values != values[updated]]
+        values[updated] = new_values
+        n += 1
+
+        starts, ends = indptr[changed], indptr[changed + 1]
+        lengths = ends - starts
+        offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+        updated = np.unique(predecessors[offsets + np.arange(lengths.sum())])
+
+    policy = q_values(np.arange(n_states), values).argmax(axis=0).astype(np.int8)
+    shape = (room_size, room_size, 2)
+    return values.reshape(shape), policy.reshape(shape)
+
+
+
+def policy_table_path(room_size: int, action_penalty: float, grab_reward: float, cache_dir: str):
+    return os.path.join(cache_dir, f"policy_{room_size}_{action_penalty!r}_{grab_reward!r}.npy")
+
+
+
+def load_policy_table(room_size: int, action_penalty: float = ACTION_PENALTY, grab_reward: float = GRAB_BANANA_REWARD,
+                      cache_dir: str = "policy_tables"):
+    """
+    Returns the optimal policy table for the given parameters. The table is
+    computed with value_iteration the first time and saved to cache_dir, later
+    calls load it from disk.
+
+    Parameters
+    ----------
+    room_size : int
+        Size of the room.
+    action_penalty : float, optional
+        Penalty of every action but the successful grab. The default is
+        ACTION_PENALTY.
+    grab_reward : float, optional
+        Reward for grabbing the banana. The default is GRAB_BANANA_REWARD.
+    cache_dir : str, optional
+        Directory of the saved tables. The default is "policy_tables".
+
+    Returns
+    -------
+    policy : np.ndarray
+        Value of the optimal MonkeyBananaAction of every state, shape
+        (room_size, room_size, 2).
+
+    """
+    path = policy_table_path(room_size, action_penalty, grab_reward, cache_dir)
+
+    if os.path.exists(path):
+        return np.load(path)
+
+    _, policy = value_iteration(room_size, action_penalty, grab_reward)
+    os.makedirs(cache_dir, exist_ok=True)
+    np.save(path, policy)
+    return policy
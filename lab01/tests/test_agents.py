@@ -0,0 +1,37 @@
+import numpy as np
+
+from monkey_banana.agents import BeliefAgent, RuleBasedAgent
+from monkey_banana.banana_environment import MonkeyBananaFOEnvironmentTask, MonkeyBananaPOEnvironmentTask, MonkeyBananaAction
+from monkey_banana.banana_environment import ACTION_PENALTY, GRAB_BANANA_REWARD
+from monkey_banana.pomdp import point_based_value_iteration
+from monkey_banana.runner import run_episode
+from monkey_banana.trajectory import TrajectoryRecorder
+
+
+def test_record_rule_based_episode(tmp_path):
+    env = MonkeyBananaFOEnvironmentTask(7, 2, 10)
+    recorder = TrajectoryRecorder()
+    RuleBasedAgent().run(env, 20, verbose=False, recorder=recorder)
+
+    trajectories = recorder.trajectories()
+    assert len(trajectories) == 1
+    transitions = list(trajectories.replay(0))
+    assert [action for _, action, _ in transitions] == \
+        [MonkeyBananaAction.MOVE_BOX_RIGHT] * 5 + [MonkeyBananaAction.CLIMB, MonkeyBananaAction.GRAB]
+    assert [reward for _, _, reward in transitions] == [-ACTION_PENALTY] * 6 + [GRAB_BANANA_REWARD]
+    assert transitions[0][0].box_position == 2 and transitions[-1][0].is_monkey_up
+
+    recorder.save(tmp_path)
+    loaded = type(trajectories).load(tmp_path)
+    assert list(loaded.replay(0)) == transitions
+
+
+def test_belief_agent_finishes_large_rooms():
+    # A coarse policy makes the loops of the policy likely
+    room_size = 50
+    policy = point_based_value_iteration(room_size, n_beliefs=100, rng=np.random.default_rng(0))
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        env = MonkeyBananaPOEnvironmentTask(int(rng.integers(room_size)), int(rng.integers(room_size)), room_size, rng=rng)
+        _, _, done = run_episode(env, BeliefAgent(room_size, policy), 2000)
+        assert done
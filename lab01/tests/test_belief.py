@@ -0,0 +1,18 @@
+import numpy as np
+
+from monkey_banana.belief import particle_beliefs, smell_likelihood_table, update_beliefs, update_particles
+
+
+def test_particles_follow_exact_beliefs():
+    room_size = 10
+    likelihoods = smell_likelihood_table(room_size)
+    rng = np.random.default_rng(0)
+    beliefs = np.ones(room_size) / room_size
+    particles = rng.integers(room_size, size=100000)
+    weights = np.full(len(particles), 1 / len(particles))
+
+    for box_position, smells in [(2, False), (5, True), (6, True), (4, False)]:
+        beliefs = update_beliefs(beliefs, box_position, True, smells, likelihoods)
+        particles, weights = update_particles(particles, weights, box_position, smells, likelihoods, rng)
+        assert np.isclose(weights.sum(), 1)
+        assert np.abs(particle_beliefs(particles, weights, room_size) - beliefs).max() < 0.02
@@ -0,0 +1,52 @@
+import io
+
+import numpy as np
+
+from monkey_banana.agents import RandomAgent
+from monkey_banana.grid_environment import GridAction, GridMonkeyBananaEnvironmentTask, GridState
+from monkey_banana.rendering import BufferedRenderer, FrameRecorder
+from monkey_banana.trajectory import TrajectoryRecorder
+
+
+def test_run_verbose(capsys):
+    env = GridMonkeyBananaEnvironmentTask(3, 2, (0, 0), [(1, 0)], [(2, 1)], rng=np.random.default_rng(0))
+    agent = RandomAgent()
+    agent.rng = np.random.default_rng(0)
+
+    agent.run(env, 10, verbose=True)
+    assert "🐒" in capsys.readouterr().out
+
+    file = io.StringIO()
+    agent.run(env, 10, verbose=True, renderer=BufferedRenderer(file))
+    assert "🐒" in file.getvalue()
+    assert capsys.readouterr().out == ""
+
+
+def test_record_grid_episode():
+    env = GridMonkeyBananaEnvironmentTask(3, 2, (0, 0), [(1, 0)], [(2, 1)], rng=np.random.default_rng(0))
+    agent = RandomAgent()
+    agent.rng = np.random.default_rng(0)
+    recorder = TrajectoryRecorder()
+    agent.run(env, 20, verbose=False, recorder=recorder)
+
+    transitions = list(recorder.trajectories().replay(0, GridState, GridAction))
+    assert len(transitions) == len(recorder)
+    assert transitions[0][0] == GridMonkeyBananaEnvironmentTask(3, 2, (0, 0), [(1, 0)], [(2, 1)]).state
+    assert sum(reward for _, _, reward in transitions) == env.performance()
+
+
+def test_record_grid_frames(capsys):
+    env = GridMonkeyBananaEnvironmentTask(3, 2, (0, 0), [(1, 0)], [(2, 1)])
+    recorder = FrameRecorder()
+    env.visualize(recorder)
+    env.perform_action(GridAction.MOVE_EAST)
+    env.visualize(recorder)
+    assert len(recorder.states) == 2
+
+    file = io.StringIO()
+    recorder.replay(BufferedRenderer(file))
+    env.restore((GridMonkeyBananaEnvironmentTask(3, 2, (0, 0), [(1, 0)], [(2, 1)]).state, 0))
+    env.visualize()
+    env.perform_action(GridAction.MOVE_EAST)
+    env.visualize()
+    assert file.getvalue() == capsys.readouterr().out
@@ -0,0 +1,35 @@
+import io
+
+import pytest
+
+from monkey_banana.agents import PlanningAgent, RuleBasedAgent
+from monkey_banana.banana_environment import MonkeyBananaFOEnvironmentTask
+from monkey_banana.rendering import BufferedRenderer, FrameRecorder, HeadlessRenderer, Renderer, render_frame
+
+
+def test_run_headless(capsys):
+    env = MonkeyBananaFOEnvironmentTask(7, 2, 10)
+    RuleBasedAgent().run(env, 20, verbose=True, renderer=HeadlessRenderer())
+    assert env.score == pytest.approx(4.4)
+    assert capsys.readouterr().out == ""
+
+
+def test_run_buffered_matches_frames(capsys):
+    def run(renderer):
+        env = MonkeyBananaFOEnvironmentTask(3, 1, 5)
+        PlanningAgent(use_transposition_table=True, max_search_depth=8).run(env, 20, verbose=True, renderer=renderer)
+
+    recorder = FrameRecorder()
+    run(recorder)
+    # The initial frame and one per step but the last one
+    assert len(recorder.states) == 4
+
+    file = io.StringIO()
+    recorder.replay(BufferedRenderer(file))
+    assert file.getvalue() == "".join(render_frame(state, room_size) for state, room_size in recorder.states)
+
+    # The buffered run holds exactly the frames and logs printed by a plain run
+    file = io.StringIO()
+    run(BufferedRenderer(file))
+    run(Renderer())
+    assert file.getvalue() == capsys.readouterr().out
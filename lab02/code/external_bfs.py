@@ -0,0 +1,203 @@
+from typing import List
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+from hanoi_tower import expand_frontier
+
+
+# Number of states whose 2-bit entries are packed in one byte of the visited array
+STATES_PER_BYTE = 4
+
+
+def _get_marks(visited: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    """
+    2-bit marks of the given states: 0 if unvisited, else 1 + depth mod 3.
+    """
+    shifts = (codes % STATES_PER_BYTE * 2).astype(np.uint8)
+    return (visited[codes // STATES_PER_BYTE] >> shifts) & 3
+
+
+def _set_marks(visited: np.ndarray, codes: np.ndarray, mark: int):
+    """
+    Sets the mark of unvisited states, `codes` being sorted and unique. The
+    bits of states sharing a byte are combined first, since a fancy-indexed
+    |= would only keep one of them.
+    """
+    if not len(codes):
+        return
+    indices = codes // STATES_PER_BYTE
+    bits = (mark << (codes % STATES_PER_BYTE * 2)).astype(np.uint8)
+    indices, starts = np.unique(indices, return_index=True)
+    visited[indices] |= np.bitwise_or.reduceat(bits, starts)
+
+
+def _clear_marks(visited: np.ndarray, mark: int, chunk_size: int):
+    """
+    Clears every entry with the given mark, chunk by chunk.
+    """
+    for i in range(0, len(visited), chunk_size):
+        chunk = np.array(visited[i:i + chunk_size])
+        for shift in range(0, 2 * STATES_PER_BYTE, 2):
+            matches = ((chunk >> shift) & 3) == mark
+            chunk[matches] &= np.uint8(~(3 << shift) & 0xFF)
+        visited[i:i + chunk_size] = chunk
+
+
+def _merge_runs(run_paths: List[str], out_path: str, n_states: int, chunk_size: int) -> int:
+    """
+    Merges sorted and disjoint runs into one sorted .npy file, by splitting the
+    code space into buckets which are sorted in memory one at a time.
+    Returns the number of codes written.
+
+    The buckets are split on a sample of every `step`-th code of each run,
+    each bucket spanning as many samples as there are runs. A run has at
+    most `step` codes between two of its samples, so a bucket holds at most
+    2 * len(runs) * step <= chunk_size codes however skewed the layer is
+    (unless there are more than chunk_size / 2 runs, where step is 1).
+    """
+    runs = [np.load(path, mmap_mode="r") for path in run_paths]
+    total = sum(len(run) for run in runs)
+    out = np.lib.format.open_memmap(out_path, mode="w+", dtype=np.int64, shape=(total,))
+
+    step = max(1, chunk_size // (2 * len(runs)))
+    samples = np.sort(np.concatenate([np.asarray(run[::step]) for run in runs]))
+    boundaries = np.concatenate(([0], samples[len(runs)::len(runs)], [n_states]))
+    position = 0
+    for low, high in zip(boundaries[:-1], boundaries[1:]):
+        parts = [run[np.searchsorted(run, low):np.searchsorted(run, high)] for run in runs]
+        bucket = np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+        out[position:position + len(bucket)] = bucket
+        position += len(bucket)
+    out.flush()
+    del out, runs
+    return total
+
+
+def _layer_path(directory: str, depth: int) -> str:
+    return os.path.join(directory, f"layer_{depth:06d}.npy")
+
+
+def _write_checkpoint(directory: str, checkpoint: dict):
+    path = os.path.join(directory, "checkpoint.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(path + ".tmp", path)
+
+
+def external_bfs(N: int, directory: str, start: int = 0, chunk_size: int = 2**20, keep_layers: bool = False,
+                 verbose: bool = True) -> List[int]:
+    """
+    Breadth-first search over all the states reachable from `start` with
+    bounded memory, for the distance distribution of large N.
+
+    The visited states are kept in a memory-mapped file with 2 bits per state
+    indexed by the base-3 code: 0 for unvisited, else 1 + depth mod 3. Each
+    layer is written to a sorted .npy file and expanded chunk by chunk. The
+    new states are kept in memory up to `chunk_size` states, beyond which they
+    go to sorted run files merged into the next layer. After each layer, the
+    number of states is appended to `counts.bin` and `checkpoint.json` records
+    the depth, so an interrupted search resumes from the last complete layer
+    when called again with the same directory.
+
+    Returns the number of states at each distance from `start`.
+    """
+    os.makedirs(directory, exist_ok=True)
+    n_states = 3**N
+    visited_path = os.path.join(directory, "visited.bin")
+    counts_path = os.path.join(directory, "counts.bin")
+    checkpoint_path = os.path.join(directory, "checkpoint.json")
+    n_bytes = math.ceil(n_states / STATES_PER_BYTE)
+
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+        assert checkpoint["N"] == N and checkpoint["start"] == start, "Checkpoint of another search"
+        depth = checkpoint["depth"]
+        visited = np.memmap(visited_path, dtype=np.uint8, mode="r+", shape=(n_bytes,))
+        # Forget the states, runs and count of the layer which was being built.
+        # This also clears the marks of every layer congruent to depth + 1
+        # modulo 3 (depth - 2, depth - 5, ...), which is harmless since moves
+        # are reversible: the neighbors of the layer depth are in the layers
+        # depth - 1, depth and depth + 1 only, so the search never looks at
+        # the marks of these older layers again
+        _clear_marks(visited, 1 + (depth + 1) % 3, chunk_size)
+        for name in os.listdir(directory):
+            if name.startswith("run_"):
+                os.remove(os.path.join(directory, name))
+            # A crash after the checkpoint can leave the consumed layer, and a
+            # crash before it the partial next layer
+            elif name.startswith("layer_"):
+                layer = int(name[len("layer_"):-len(".npy")])
+                if layer > depth or (layer < depth and not keep_layers):
+                    os.remove(os.path.join(directory, name))
+        with open(counts_path, "r+b") as f:
+            f.truncate((depth + 1) * 8)
+        if verbose:
+            print(f"Resuming at depth {depth}")
+    else:
+        depth = 0
+        visited = np.memmap(visited_path, dtype=np.uint8, mode="w+", shape=(n_bytes,))
+        _set_marks(visited, np.array([start], dtype=np.int64), 1)
+        np.save(_layer_path(directory, 0), np.array([start], dtype=np.int64))
+        visited.flush()
+        np.array([1], dtype=np.int64).tofile(counts_path)
+        _write_checkpoint(directory, {"N": N, "start": start, "depth": 0})
+
+    count = np.fromfile(counts_path, dtype=np.int64)[-1]
+    while count > 0:
+        t = time.time()
+        mark = 1 + (depth + 1) % 3
+        layer = np.load(_layer_path(directory, depth), mmap_mode="r")
+        next_path = _layer_path(directory, depth + 1)
+
+        buffer, buffered, run_paths = [], 0, []
+        for i in range(0, len(layer), chunk_size):
+            neighbors, _ = expand_frontier(np.asarray(layer[i:i + chunk_size], dtype=np.int64), N)
+            neighbors = np.unique(neighbors)
+            new = neighbors[_get_marks(visited, neighbors) == 0]
+            _set_marks(visited, new, mark)
+            buffer.append(new)
+            buffered += len(new)
+            if buffered > chunk_size:
+                run_paths.append(os.path.join(directory, f"run_{len(run_paths):06d}.npy"))
+                np.save(run_paths[-1], np.sort(np.concatenate(buffer)))
+                buffer, buffered = [], 0
+        del layer
+
+        if run_paths:
+            if buffered:
+                run_paths.append(os.path.join(directory, f"run_{len(run_paths):06d}.npy"))
+                np.save(run_paths[-1], np.sort(np.concatenate(buffer)))
+            count = _merge_runs(run_paths, next_path, n_states, chunk_size)
+            for path in run_paths:
+                os.remove(path)
+        else:
+            next_layer = np.sort(np.concatenate(buffer))
+            np.save(next_path, next_layer)
+            count = len(next_layer)
+        visited.flush()
+
+        with open(counts_path, "ab") as f:
+            np.array([count], dtype=np.int64).tofile(f)
+        _write_checkpoint(directory, {"N": N, "start": start, "depth": depth + 1})
+        if not keep_layers:
+            os.remove(_layer_path(directory, depth))
+        depth += 1
+        if verbose:
+            print(f"Depth {depth}: {count} states ({time.time() - t:.2f}s)")
+
+    # The last layer is empty
+    if os.path.exists(_layer_path(directory, depth)):
+        os.remove(_layer_path(directory, depth))
+    return np.fromfile(counts_path, dtype=np.int64)[:-1].tolist()
+
+
+if __name__ == "__main__":
+    N = 12
+    counts = external_bfs(N, f"external_bfs_{N}", verbose=False)
+    print(f"{sum(counts)} states, eccentricity {len(counts) - 1}")
+    print(f"Mean distance from the start: {sum(d * c for d, c in enumerate(counts)) / sum(counts):.2f}")
@@ -0,0 +1,151 @@
+from typing import Iterator, List, Tuple
+
+from hanoi_tower import HanoiTowerState
+
+
+def pegs_of_discs(state: HanoiTowerState) -> List[int]:
+    """
+    Peg of each disc, the peg of disc d being at index d - 1.
+    """
+    pegs = [0] * state.N
+    for p, peg in enumerate(state.pegs):
+        for d in peg:
+            pegs[d - 1] = p
+    return pegs
+
+
+def tower_moves(n: int, a: int, b: int) -> Iterator[Tuple[int, int]]:
+    """
+    Moves of a tower of the `n` smallest discs from peg `a` to peg `b`, in
+    O(1) per move: move m goes from peg (m & (m - 1)) % 3 to peg
+    ((m | (m - 1)) + 1) % 3 for a tower moving from peg 0 to peg 2 (n odd)
+    or to peg 1 (n even), and the pegs are renamed accordingly.
+    """
+    destination = 2 if n % 2 else 1
+    rename = [0, 0, 0]
+    rename[0], rename[destination], rename[3 - destination] = a, b, 3 - a - b
+    for m in range(1, 2**n):
+        yield rename[(m & (m - 1)) % 3], rename[((m | (m - 1)) + 1) % 3]
+
+
+def _tower_targets(pegs: List[int], n: int, p: int) -> List[int]:
+    """
+    Peg on which the discs 1..d must be gathered, for each d <= n, to gather
+    the discs 1..n on peg `p` optimally: a disc which is not on the peg of
+    its tower sends the smaller discs to the third peg.
+    """
+    targets = [0] * n
+    for d in range(n, 0, -1):
+        targets[d - 1] = p
+        if pegs[d - 1] != p:
+            p = 3 - pegs[d - 1] - p
+    return targets
+
+
+def distance_to_tower(pegs: List[int], n: int, p: int) -> int:
+    """
+    Number of moves needed to gather the discs 1..n on peg `p`, in O(n).
+    """
+    moves = 0
+    for d in range(n, 0, -1):
+        if pegs[d - 1] != p:
+            moves += 2 ** (d - 1)
+            p = 3 - pegs[d - 1] - p
+    return moves
+
+
+def moves_to_tower(pegs: List[int], n: int, p: int) -> Iterator[Tuple[int, int]]:
+    """
+    Optimal moves gathering the discs 1..n, placed as in `pegs`, on peg `p`.
+    """
+    targets = _tower_targets(pegs, n, p)
+    for d in range(1, n + 1):
+        if pegs[d - 1] != targets[d - 1]:
+            # The discs 1..d-1 are now gathered on the third peg
+            yield pegs[d - 1], targets[d - 1]
+            yield from tower_moves(d - 1, 3 - pegs[d - 1] - targets[d - 1], targets[d - 1])
+
+
+def moves_from_tower(pegs: List[int], n: int, p: int) -> Iterator[Tuple[int, int]]:
+    """
+    Optimal moves from the discs 1..n gathered on peg `p` to the placement
+    `pegs`: moves_to_tower backwards, each move being reversed.
+    """
+    targets = _tower_targets(pegs, n, p)
+    for d in range(n, 0, -1):
+        if pegs[d - 1] != targets[d - 1]:
+            yield from tower_moves(d - 1, targets[d - 1], 3 - pegs[d - 1] - targets[d - 1])
+            yield targets[d - 1], pegs[d - 1]
+
+
+def _plan(start: List[int], target: List[int]):
+    """
+    Largest disc k which has to move, and whether it moves directly to its
+    target peg or twice, through the third peg. These are the only two
+    candidates for an optimal solution between any two states.
+    """
+    k = len(start)
+    while k and start[k - 1] == target[k - 1]:
+        k -= 1
+    if k == 0:
+        return 0, 0, True
+
+    c, t = start[k - 1], target[k - 1]
+    o = 3 - c - t
+    direct = distance_to_tower(start, k - 1, o) + 1 + distance_to_tower(target, k - 1, o)
+    through = distance_to_tower(start, k - 1, t) + 2 ** (k - 1) + 1 + distance_to_tower(target, k - 1, c)
+    return k, min(direct, through), direct <= through
+
+
+def distance(start: HanoiTowerState, target: HanoiTowerState) -> int:
+    """
+    Exact number of moves of an optimal solution from `start` to `target`,
+    in O(N).
+    """
+    return _plan(pegs_of_discs(start), pegs_of_discs(target))[1]
+
+
+def optimal_moves(start: HanoiTowerState, target: HanoiTowerState) -> Iterator[Tuple[int, int]]:
+    """
+    Lazy generator of the (from peg, to peg) moves of an optimal solution
+    from `start` to `target`. Nothing but the placement of the discs is kept
+    in memory, so N=64 can be streamed.
+    """
+    start, target = pegs_of_discs(start), pegs_of_discs(target)
+    k, _, direct = _plan(start, target)
+    if k == 0:
+        return
+
+    c, t = start[k - 1], target[k - 1]
+    o = 3 - c - t
+    if direct:
+        yield from moves_to_tower(start, k - 1, o)
+        yield c, t
+        yield from moves_from_tower(target, k - 1, o)
+    else:
+        yield from moves_to_tower(start, k - 1, t)
+        yield c, o
+        yield from tower_moves(k - 1, t, c)
+        yield o, t
+        yield from moves_from_tower(target, k - 1, c)
+
+
+def perfect_heuristic(N: int):
+    """
+    Exact distance from an encoded state to the nearest goal of is_goal, to
+    be used as the heuristic of a search engine (e.g. multipeg_hanoi.astar
+    with K=3).
+    """
+    def heuristic(code: int) -> int:
+        pegs = [code // 3**i % 3 for i in range(N)]
+        return min(distance_to_tower(pegs, N, 1), distance_to_tower(pegs, N, 2))
+    return heuristic
+
+
+if __name__ == "__main__":
+    N = 64
+    start = HanoiTowerState(N)
+    target = HanoiTowerState(N, [[], [], list(range(N, 0, -1))])
+    print(f"Distance for N={N}: {distance(start, target)}")
+    for i, move in zip(range(10), optimal_moves(start, target)):
+        print(f"Move {i + 1}: {move}")
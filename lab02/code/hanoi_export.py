@@ -0,0 +1,100 @@
+from typing import Iterable, Tuple, Union
+import gzip
+import io
+
+
+FORMATS = ("moves", "snapshots", "frames")
+
+
+class SolutionWriter:
+    """
+    Streams a solution, given as a start state and an iterable of (from peg,
+    to peg) moves, to a text output in one of the FORMATS:
+
+    - "moves": one line "<from><to>" per move, after a header line with the
+      number of discs and pegs,
+    - "snapshots": the moves, plus a line "# <step> <pegs>" with the whole
+      board every `snapshot_every` moves, pegs being separated by "|",
+    - "frames": "Step i:" followed by the ASCII board of every state, as
+      printed by bfs and dls.
+
+    Only the current state is kept, and the text is written by blocks of
+    `block_size` lines, so the memory does not depend on the length of the
+    solution. A path ending with ".gz" is written gzip-compressed.
+    """
+
+    def __init__(self, output: Union[str, io.TextIOBase], format: str = "moves", snapshot_every: int = 1000,
+                 block_size: int = 4096):
+        assert format in FORMATS, f"Format must be one of {FORMATS}"
+        self.format = format
+        self.snapshot_every = snapshot_every
+        self.block_size = block_size
+        self.block = []
+
+        self.owns_file = isinstance(output, str)
+        if not self.owns_file:
+            self.file = output
+        elif output.endswith(".gz"):
+            self.file = gzip.open(output, "wt")
+        else:
+            self.file = open(output, "w", buffering=2**20)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _emit(self, text: str):
+        self.block.append(text)
+        if len(self.block) >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        self.file.write("".join(self.block))
+        self.block.clear()
+
+    def close(self):
+        self.flush()
+        if self.owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+    def _snapshot(self, step: int, state):
+        self._emit(f"# {step} " + "|".join(" ".join(map(str, peg)) for peg in state.pegs) + "\n")
+
+    def write(self, start, moves: Iterable[Tuple[int, int]]) -> int:
+        """
+        Writes the solution from `start` (left unchanged) and returns the
+        number of moves.
+        """
+        state = type(start)(start.N, [list(peg) for peg in start.pegs])
+        n = 0
+
+        if self.format == "frames":
+            self._emit(f"Step 0:\n{state.render()}\n")
+        else:
+            self._emit(f"# N={state.N} K={len(state.pegs)}\n")
+            if self.format == "snapshots":
+                self._snapshot(0, state)
+
+        for n, (a, b) in enumerate(moves, 1):
+            if not state.move(a, b):
+                raise ValueError(f"Illegal move {(a, b)} at step {n}")
+            if self.format == "frames":
+                self._emit(f"Step {n}:\n{state.render()}\n")
+            else:
+                self._emit(f"{a}{b}\n")
+                if self.format == "snapshots" and n % self.snapshot_every == 0:
+                    self._snapshot(n, state)
+        return n
+
+
+def export_solution(start, moves: Iterable[Tuple[int, int]], output: Union[str, io.TextIOBase],
+                    format: str = "moves", snapshot_every: int = 1000) -> int:
+    """
+    Writes a solution with a SolutionWriter and returns the number of moves.
+    """
+    with SolutionWriter(output, format, snapshot_every) as writer:
+        return writer.write(start, moves)
@@ -1,31 +1,70 @@
-from typing import Optional, List, Set
-from copy import deepcopy
-from collections import deque
+from typing import Optional, List, Set, Tuple
+from functools import lru_cache
+import sys
+
+import numpy as np
+
+from hanoi_export import export_solution
+
+
+@lru_cache(maxsize=None)
+def peg_moves(K: int) -> List[Tuple[int, int]]:
+    """
+    Moves (from peg, to peg) between `K` pegs, in the order used by
+    neighbor_codes and expand_frontier.
+    """
+    return [(a, b) for a in range(K) for b in range(K) if a != b]
+
+
+MOVES = peg_moves(3)
 
 
 class HanoiTowerState:
     """
-    Tower of Hanoi with three pegs and `N` discs.
+    Tower of Hanoi with `K` pegs (three by default) and `N` discs.
     """
 
-    def __init__(self, N: int, pegs: Optional[List[List]] = None):
+    def __init__(self, N: int, pegs: Optional[List[List]] = None, K: int = 3):
         self.N = N
-        self.pegs: list[list] = [list(range(N, 0, -1)), [], []] if not pegs else pegs
+        self.K = len(pegs) if pegs else K
+        self.pegs: list[list] = [list(range(N, 0, -1))] + [[] for _ in range(K - 1)] if not pegs else pegs
 
     def pegs_representation(self):
-        return (tuple(self.pegs[0]), tuple(self.pegs[1]), tuple(self.pegs[2]))
+        return tuple(tuple(peg) for peg in self.pegs)
+
+    def encode(self) -> int:
+        """
+        Packs the state into an int with one base-K digit per disc: the digit
+        of weight K^(d-1) is the peg of disc d.
+        """
+        code = 0
+        for p, peg in enumerate(self.pegs):
+            for d in peg:
+                code += p * self.K ** (d - 1)
+        return code
+
+    @staticmethod
+    def decode(N: int, code: int, K: int = 3) -> "HanoiTowerState":
+        digits = [(code // K**i) % K for i in range(N)]
+        pegs = [[] for _ in range(K)]
+        for d in range(N, 0, -1):
+            pegs[digits[d - 1]].append(d)
+        return HanoiTowerState(N, pegs)
 
     def visualize(self):
-        base = "  ".join(["=" * 2 * self.N] * 3)
+        print(self.render())
+
+    def render(self) -> str:
+        base = "  ".join(["=" * 2 * self.N] * self.K)
         rev_lines = [base]
         for r in range(self.N):
             line = []
-            for p in range(3):
+            for p in range(self.K):
                 i = self.pegs[p][r] if len(self.pegs[p]) > r else 0
                 tmp = self.N - i
                 line.append(tmp * " " + i * 2 * "-" + tmp * " ")
             rev_lines.append("  ".join(line))
-        print("\n".join(rev_lines[::-1]))
+        return "\n".join(rev_lines[::-1])
 
     def move(self, p1: int, p2: int):
         """
@@ -45,48 +84,231 @@ class HanoiTowerState:
         all possible configurations that can be reached via a
         single `move` call.
         """
-        nbs = []
-        for a in range(3):
-            for b in range(3):
-                if a == b:
-                    continue
-                if self.move(a, b):
-                    nbs.append(deepcopy(self))
-                    self.move(b, a)
-        return nbs
+        return [HanoiTowerState.decode(self.N, c, self.K) for c in neighbor_codes(self.encode(), self.N, self.K)]
+
+
+def _check_three_pegs(state: HanoiTowerState):
+    if state.K != 3:
+        raise ValueError(f"This search only solves the three-peg tower, not {state.K} pegs (see multipeg_hanoi)")
+
+
+def top_discs(code: int, N: int, K: int = 3) -> List[int]:
+    """
+    Returns the smallest disc of each peg of an encoded state, 0 for an
+    empty peg.
+    """
+    tops = [0] * K
+    for d in range(N, 0, -1):
+        tops[code // K ** (d - 1) % K] = d
+    return tops
+
+
+def neighbor_codes(code: int, N: int, K: int = 3) -> List[int]:
+    """
+    Returns the encoded neighbors of an encoded state with `K` pegs, in O(N)
+    and without building any HanoiTowerState.
+    """
+    tops = top_discs(code, N, K)
+    nbs = []
+    for a, b in peg_moves(K):
+        if tops[a] and (not tops[b] or tops[a] < tops[b]):
+            nbs.append(code + (b - a) * K ** (tops[a] - 1))
+    return nbs
+
+
+def goal_codes(N: int) -> Set[int]:
+    """
+    Codes of the goal states, all the discs on peg 1 or on peg 2.
+    """
+    return {(3**N - 1) // 2, 3**N - 1}
 
 
 def is_goal(state: HanoiTowerState):
-    return state.pegs[1] == list(range(state.N, 0, -1)) or state.pegs[2] == list(
-        range(state.N, 0, -1)
-    )
-
-
-def bfs(start: HanoiTowerState):
-    q = deque([start])
-    seen = [start.pegs]
-
-    parent = {start: None}
-    while q:
-        v = q.pop()
-        # check if we are done
-        if is_goal(v):
-            steps = []
-            while v:
-                steps.append(v)
-                v = parent[v]
-            
-            # Visualize the resulting path
-            for i, s in enumerate(steps[::-1]):
-                print(f"Step {i}:")
-                s.visualize()
-            return
-        for w in v.get_neighbors():
-            if w.pegs in seen:
-                continue
-            seen.append(w.pegs)
-            q.appendleft(w)
-            parent[w] = v
+    return any(peg == list(range(state.N, 0, -1)) for peg in state.pegs[1:])
+
+
+def expand_frontier(codes: np.ndarray, N: int, K: int = 3):
+    """
+    Computes the neighbors of a whole array of encoded states with `K` pegs
+    at once.
+
+    Returns
+    -------
+    neighbors : np.ndarray
+        Encoded neighbors.
+    moves : np.ndarray
+        Index in peg_moves(K) (MOVES for three pegs) of the move leading to
+        each neighbor.
+    """
+    powers = K ** np.arange(N + 1, dtype=np.int64)
+    digits = codes[:, None] // powers[:N] % K
+
+    # Smallest disc (0-based) of each peg, N for an empty peg
+    on_peg = digits[None] == np.arange(K)[:, None, None]
+    tops = np.where(on_peg.any(axis=2), on_peg.argmax(axis=2), N)
+
+    a, b = np.array(peg_moves(K)).T
+    valid = tops[a] < tops[b]
+    moves, parents = np.nonzero(valid)
+    neighbors = codes[parents] + (b - a)[moves] * powers[tops[a[moves], parents]]
+    return neighbors, moves.astype(np.uint8)
+
+
+def bfs_codes(start: int, N: int) -> Optional[List[int]]:
+    """
+    Breadth-first search over encoded states, expanding whole levels at once.
+    The visited states are kept in a 3^N array which also stores the move
+    leading to each of them (0 = unvisited), from which the path is rebuilt.
+
+    Returns the codes of the states along a shortest path to a goal, or None.
+    """
+    goals = np.array(sorted(goal_codes(N)))
+    parent_move = np.zeros(3**N, dtype=np.uint8)
+    parent_move[start] = len(MOVES) + 1
+    frontier = np.array([start], dtype=np.int64)
+
+    while len(frontier) and not parent_move[goals].any():
+        neighbors, moves = expand_frontier(frontier, N)
+        new = parent_move[neighbors] == 0
+        neighbors, moves = neighbors[new], moves[new] + 1
+        parent_move[neighbors] = moves
+        # A state reached from several parents keeps the move of one of them,
+        # and a move and a state determine the parent, so this deduplicates
+        frontier = neighbors[parent_move[neighbors] == moves]
+
+    return parent_path(parent_move, start, goals, N)
+
+
+def parent_path(parent_move: np.ndarray, start: int, goals: np.ndarray, N: int) -> Optional[List[int]]:
+    """
+    Rebuilds the codes of the states from `start` to the first reached goal
+    from an array of moves leading to each state (0 = unvisited).
+    """
+    reached = goals[parent_move[goals] != 0]
+    if not len(reached):
+        return None
+
+    path = [int(reached[0])]
+    while path[-1] != start:
+        a, b = MOVES[parent_move[path[-1]] - 1]
+        disc = top_discs(path[-1], N)[b]
+        path.append(path[-1] - (b - a) * 3 ** (disc - 1))
+    return path[::-1]
+
+
+def bfs(start: HanoiTowerState, verbose: bool = True):
+    """
+    Returns the states along a shortest path from `start` to a goal, and
+    visualizes them if `verbose`.
+    """
+    _check_three_pegs(start)
+    codes = bfs_codes(start.encode(), start.N)
+    if codes is None:
+        return None
+    steps = [HanoiTowerState.decode(start.N, c) for c in codes]
+
+    # Visualize the resulting path
+    if verbose:
+        export_solution(steps[0], (move_between(c, nc, start.N) for c, nc in zip(codes, codes[1:])),
+                        sys.stdout, "frames")
+    return steps
+
+
+def _isin_sorted(values: np.ndarray, sorted_codes: np.ndarray) -> np.ndarray:
+    if not len(sorted_codes):
+        return np.zeros(len(values), dtype=bool)
+    idx = np.minimum(np.searchsorted(sorted_codes, values), len(sorted_codes) - 1)
+    return sorted_codes[idx] == values
+
+
+def move_between(code: int, next_code: int, N: int):
+    """
+    Returns the move (from peg, to peg) between two neighboring encoded states.
+    """
+    for d in range(N):
+        a, b = code // 3**d % 3, next_code // 3**d % 3
+        if a != b:
+            return a, b
+
+
+def bidirectional_bfs_codes(start: int, N: int, goals: Optional[Set[int]] = None,
+                            max_nodes: Optional[int] = None):
+    """
+    Bidirectional breadth-first search between `start` and a set of goal
+    states, always expanding the side with the smaller frontier. Each side
+    keeps its levels as sorted arrays of codes, so the memory grows with the
+    number of visited states rather than with 3^N, and the search gives up
+    once more than `max_nodes` states are visited.
+
+    Since moves are reversible, the neighbors of a level only lie in the
+    previous, same or next level, and as long as both sides are disjoint a new
+    level can only meet the frontier of the other side. The first meeting
+    therefore gives a shortest path.
+
+    Returns
+    -------
+    path : list or None
+        Codes of the states along a shortest path, None if there is none or
+        if more than `max_nodes` states were visited.
+    expanded : dict
+        Number of states expanded by the "forward" and "backward" sides.
+    """
+    goals = goal_codes(N) if goals is None else goals
+    # Levels are stored on 32 bits whenever the codes fit
+    dtype = np.uint32 if 3**N <= 2**32 else np.int64
+    levels = {
+        "forward": [np.array([start], dtype=dtype)],
+        "backward": [np.array(sorted(goals), dtype=dtype)],
+    }
+    expanded = {"forward": 0, "backward": 0}
+    visited = 1 + len(goals)
+
+    meeting = np.intersect1d(levels["forward"][-1], levels["backward"][-1])
+    while not len(meeting):
+        side = min(levels, key=lambda k: len(levels[k][-1]))
+        other = "backward" if side == "forward" else "forward"
+        side_levels = levels[side]
+        if not len(side_levels[-1]) or (max_nodes is not None and visited > max_nodes):
+            return None, expanded
+
+        expanded[side] += len(side_levels[-1])
+        neighbors, _ = expand_frontier(side_levels[-1], N)
+        new = ~_isin_sorted(neighbors, side_levels[-1])
+        if len(side_levels) > 1:
+            new &= ~_isin_sorted(neighbors, side_levels[-2])
+        side_levels.append(np.unique(neighbors[new]).astype(dtype))
+        visited += len(side_levels[-1])
+
+        meeting = np.intersect1d(side_levels[-1], levels[other][-1], assume_unique=True)
+
+    # Walk back from the meeting state to the start and to a goal, looking for
+    # a neighbor in the previous level of each side
+    halves = {}
+    for side in levels:
+        path = [int(meeting[0])]
+        for level in levels[side][-2::-1]:
+            nbs = np.array(neighbor_codes(path[-1], N), dtype=np.int64)
+            path.append(int(nbs[_isin_sorted(nbs, level)][0]))
+        halves[side] = path
+    return halves["forward"][::-1] + halves["backward"][1:], expanded
+
+
+def bidirectional_bfs(start: HanoiTowerState, verbose: bool = True, max_nodes: Optional[int] = None):
+    """
+    Solves the tower with bidirectional_bfs_codes.
+
+    Returns the list of moves (from peg, to peg) of a shortest solution, or
+    None, and the number of states expanded by each side.
+    """
+    _check_three_pegs(start)
+    N = start.N
+    path, expanded = bidirectional_bfs_codes(start.encode(), N, max_nodes=max_nodes)
+    moves = None if path is None else [move_between(c, nc, N) for c, nc in zip(path, path[1:])]
+    if verbose:
+        print(f"Expanded forward: {expanded['forward']}, backward: {expanded['backward']}")
+        if moves is not None:
+            print(f"Solution in {len(moves)} moves: {moves}")
+    return moves, expanded
 
 
 class DLSNode:
@@ -96,38 +318,121 @@ class DLSNode:
         self.depth = depth
 
 
-def is_cycle(node: DLSNode) -> bool:
-    st = node.state
-    while node.parent != None:
-        if st.pegs == node.parent.state.pegs:
-            return True
+def _path_states(node: DLSNode, N: int) -> List[HanoiTowerState]:
+    steps = []
+    while node:
+        steps.append(HanoiTowerState.decode(N, node.state))
         node = node.parent
-    return False
-
-
-def dls(start: HanoiTowerState, depth_limit: int, verbose: bool = False):
-    S = [DLSNode(start, None, 0)]
-    while S:
-        node = S.pop()
-        if verbose: node.state.visualize()
-        if is_goal(node.state):
-            steps = []
-            while node:
-                steps.append(node.state)
-                node = node.parent
-            for i, s in enumerate(steps[::-1]):
-                print(f"Step {i}:")
-                s.visualize()
-            return
-        if node.depth >= depth_limit:
-            continue
-        elif not is_cycle(node):
-            for w in node.state.get_neighbors():
-                S.append(DLSNode(w, node, node.depth + 1))
+    return steps[::-1]
+
+
+def depth_limited_search(start: int, N: int, depth_limit: int, goals: Optional[Set[int]] = None,
+                         use_transposition_table: bool = False, visit=None):
+    """
+    Depth-first search over encoded states up to `depth_limit` moves. The
+    stack holds the nodes of the current path with an iterator over their
+    remaining neighbors, and the states of the path are kept in a set updated
+    on every push and pop, so cycles are detected in O(1). With
+    `use_transposition_table`, a state is only expanded again when it is
+    reached at a smaller depth than before.
+
+    The DLSNode parent links are only used to rebuild the path.
+
+    Returns
+    -------
+    node : DLSNode or None
+        Goal node found.
+    expanded : int
+        Number of nodes expanded.
+    """
+    goals = goal_codes(N) if goals is None else goals
+    root = DLSNode(start, None, 0)
+    if start in goals:
+        return root, 0
+    if depth_limit <= 0:
+        return None, 0
+
+    on_path = {start}
+    best_depth = {start: 0}
+    stack = [(root, iter(neighbor_codes(start, N)))]
+    expanded = 1
+    if visit: visit(start)
+
+    while stack:
+        node, children = stack[-1]
+        depth = node.depth + 1
+        for w in children:
+            if w in on_path:
+                continue
+            if use_transposition_table:
+                if best_depth.get(w, depth + 1) <= depth:
+                    continue
+                best_depth[w] = depth
+            child = DLSNode(w, node, depth)
+            if w in goals:
+                return child, expanded
+            if depth < depth_limit:
+                on_path.add(w)
+                stack.append((child, iter(neighbor_codes(w, N))))
+                expanded += 1
+                if visit: visit(w)
+                break
+        else:
+            stack.pop()
+            on_path.discard(node.state)
+    return None, expanded
+
+
+def iddfs(start: HanoiTowerState, max_depth: Optional[int] = None, use_transposition_table: bool = True,
+          verbose: bool = False):
+    """
+    Iterative deepening: depth_limited_search with limits 0, 1, 2, ... up to
+    `max_depth` (default 2^N - 1, the largest distance to a goal).
+
+    Without the transposition table, every path without cycles is explored,
+    which grows exponentially with the depth: N=5 already expands about 25M
+    nodes, against about 14k with it.
+
+    Returns the states along a shortest path, or None, and the number of
+    nodes expanded by each iteration.
+    """
+    _check_three_pegs(start)
+    N = start.N
+    max_depth = 2**N - 1 if max_depth is None else max_depth
+    code = start.encode()
+    counts = []
+    for depth_limit in range(max_depth + 1):
+        node, expanded = depth_limited_search(code, N, depth_limit,
+                                              use_transposition_table=use_transposition_table)
+        counts.append(expanded)
+        if verbose:
+            print(f"Depth limit {depth_limit}: {expanded} nodes expanded")
+        if node is not None:
+            return _path_states(node, N), counts
+    return None, counts
+
+
+def dls(start: HanoiTowerState, depth_limit: int, verbose: bool = False, use_transposition_table: bool = True):
+    """
+    Depth-limited search with depth_limited_search, printing the path found.
+    Returns the states along the path, or None.
+    """
+    _check_three_pegs(start)
+    N = start.N
+    visit = (lambda code: HanoiTowerState.decode(N, code).visualize()) if verbose else None
+    node, _ = depth_limited_search(start.encode(), N, depth_limit,
+                                   use_transposition_table=use_transposition_table, visit=visit)
+    if node is None:
+        return None
+    steps = _path_states(node, N)
+    codes = [s.encode() for s in steps]
+    export_solution(steps[0], (move_between(c, nc, N) for c, nc in zip(codes, codes[1:])), sys.stdout, "frames")
+    return steps
 
 
 if __name__ == "__main__":
     N = 6
     state = HanoiTowerState(N)
     # bfs(state)
+    # bidirectional_bfs(state)
     dls(state, 65, False)
@@ -0,0 +1,147 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Tuple
+import os
+import time
+
+import numpy as np
+
+from hanoi_tower import MOVES, HanoiTowerState, bfs_codes, expand_frontier, goal_codes, parent_path
+
+
+# Array of moves leading to each state (0 = unvisited) shared by the workers
+_parent_move = None
+_shared = None
+
+
+def _attach(name: str, N: int):
+    global _parent_move, _shared
+    _shared = SharedMemory(name=name)
+    _parent_move = np.ndarray((3**N,), dtype=np.uint8, buffer=_shared.buf)
+
+
+def _detach():
+    global _parent_move, _shared
+    # The array must be released before the shared memory can be closed
+    _parent_move = None
+    if _shared is not None:
+        _shared.close()
+        _shared = None
+
+
+def _expand_chunk(frontier: np.ndarray, N: int) -> np.ndarray:
+    """
+    Expands a chunk of the frontier and marks its new states in the shared
+    array. A state reached from several chunks keeps the move written last,
+    and the chunk which wrote it keeps it: since the marks of the previous
+    levels are never overwritten, every new state is returned at least once.
+    """
+    neighbors, moves = expand_frontier(frontier, N)
+    new = _parent_move[neighbors] == 0
+    neighbors, moves = neighbors[new], moves[new] + 1
+    _parent_move[neighbors] = moves
+    return neighbors[_parent_move[neighbors] == moves]
+
+
+def parallel_bfs_codes(start: int, N: int, n_workers: Optional[int] = None, chunk_size: int = 2**12,
+                       verbose: bool = False) -> Tuple[Optional[List[int]], List[Tuple[int, float]]]:
+    """
+    Level-synchronous breadth-first search over encoded states: each level
+    is split into chunks of `chunk_size` states expanded in parallel by
+    `n_workers` processes (all the cores by default), which deduplicate
+    against a 3^N array of moves (as in bfs_codes) in shared memory. The
+    chunks of one level are independent, and a level starts once the
+    previous one is complete. Levels smaller than one chunk, and every level
+    when `n_workers` is 1, are expanded in the main process.
+
+    From a tower, the level d holds at most 2^N states and only a few levels
+    come close, so the pool only pays off on the large levels of large N.
+
+    Returns the codes of the states along a shortest path to a goal, or
+    None, and the size and expansion time of each level.
+    """
+    n_workers = n_workers or os.cpu_count()
+    goals = np.array(sorted(goal_codes(N)))
+    shared = SharedMemory(create=True, size=3**N)
+    executor = None
+    try:
+        _attach(shared.name, N)
+        _parent_move[:] = 0
+        _parent_move[start] = len(MOVES) + 1
+        if n_workers > 1:
+            executor = ProcessPoolExecutor(n_workers, initializer=_attach, initargs=(shared.name, N))
+
+        frontier = np.array([start], dtype=np.int64)
+        levels = []
+        while len(frontier) and not _parent_move[goals].any():
+            t, size = time.time(), len(frontier)
+            if executor is None or len(frontier) <= chunk_size:
+                frontier = _expand_chunk(frontier, N)
+            else:
+                chunks = [frontier[i:i + chunk_size] for i in range(0, len(frontier), chunk_size)]
+                frontier = np.unique(np.concatenate(list(executor.map(_expand_chunk, chunks, [N] * len(chunks)))))
+            levels.append((size, time.time() - t))
+            if verbose:
+                print(f"Level {len(levels) - 1}: {size} states expanded in {levels[-1][1]:.3f}s")
+
+        return parent_path(_parent_move, start, goals, N), levels
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        _detach()
+        shared.close()
+        shared.unlink()
+
+
+def parallel_bfs(start: HanoiTowerState, n_workers: Optional[int] = None, chunk_size: int = 2**12):
+    """
+    Returns the states along a shortest path from `start` to a goal, found
+    with parallel_bfs_codes.
+    """
+    if start.K != 3:
+        raise ValueError(f"parallel_bfs only solves the three-peg tower, not {start.K} pegs")
+    codes, _ = parallel_bfs_codes(start.encode(), start.N, n_workers, chunk_size)
+    if codes is None:
+        return None
+    return [HanoiTowerState.decode(start.N, c) for c in codes]
+
+
+def scaling_report(N: int, worker_counts: List[int], chunk_size: int = 2**12) -> Dict[int, List[Tuple[int, float]]]:
+    """
+    Times bfs_codes, then parallel_bfs_codes with each number of workers.
+    The levels are grouped by their number of states (powers of 2), and the
+    time spent on each group is printed with its speedup versus the parallel
+    engine on one worker, followed by the total times and their speedup
+    versus bfs_codes.
+
+    Returns the size and time of each level for each number of workers.
+    """
+    start = HanoiTowerState(N).encode()
+    t = time.time()
+    serial_path = bfs_codes(start, N)
+    serial_time = time.time() - t
+
+    runs, totals = {}, {}
+    for n_workers in sorted(set([1] + list(worker_counts))):
+        t = time.time()
+        path, runs[n_workers] = parallel_bfs_codes(start, N, n_workers, chunk_size)
+        totals[n_workers] = time.time() - t
+        assert len(path) == len(serial_path), "Parallel and serial paths differ in length"
+
+    groups = sorted({size.bit_length() for size, _ in runs[1]})
+    print(f"{'states':>16}{'levels':>8}" + "".join(f"{f'{n} workers':>20}" for n in runs))
+    for g in groups:
+        times = {n: sum(t for size, t in levels if size.bit_length() == g) for n, levels in runs.items()}
+        n_levels = sum(size.bit_length() == g for size, _ in runs[1])
+        cells = [f"{times[n]:.3f}s (x{times[1] / max(times[n], 1e-9):.2f})" for n in runs]
+        print(f"{f'{2**(g - 1)}-{2**g - 1}':>16}{n_levels:>8}" + "".join(f"{cell:>20}" for cell in cells))
+    cells = [f"{totals[n]:.2f}s (x{serial_time / totals[n]:.2f})" for n in runs]
+    print(f"{'total':>16}{len(runs[1]):>8}" + "".join(f"{cell:>20}" for cell in cells))
+    print(f"bfs_codes: {serial_time:.2f}s")
+    return runs
+
+
+if __name__ == "__main__":
+    N = 16
+    counts = [1, 2, 4, 8, 16, 32, 64]
+    scaling_report(N, [n for n in counts if n < os.cpu_count()] + [os.cpu_count()])
@@ -1,23 +1,77 @@
 from collections import defaultdict
 import csv
 import math
-from copy import deepcopy
+import os
 import time
 
+import numpy as np
+
+
+def build_csr(links_path: str):
+    """
+    Reads an edge list ("source target" per line) into compressed sparse row
+    arrays: the links of page a are indices[indptr[a]:indptr[a + 1]], in the
+    order of the file.
+    """
+    edges = np.fromfile(links_path, dtype=np.int64, sep=' ').reshape(-1, 2)
+    n_pages = int(edges.max()) + 1 if len(edges) else 0
+    order = np.argsort(edges[:, 0], kind='stable')
+    indptr = np.zeros(n_pages + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edges[:, 0], minlength=n_pages), out=indptr[1:])
+    assert indptr[-1] < 2**31, "Too many links for int32 offsets"
+    return indptr.astype(np.int32), edges[order, 1].astype(np.int32)
+
+
+def transpose_csr(indptr: np.ndarray, indices: np.ndarray):
+    """
+    CSR arrays of the reversed links: the pages linking to page b are
+    indices[indptr[b]:indptr[b + 1]] of the result, in increasing order.
+    """
+    n_pages = max(len(indptr) - 1, int(indices.max()) + 1 if len(indices) else 0)
+    sources = np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr))
+    order = np.argsort(indices, kind='stable')
+    reverse_indptr = np.zeros(n_pages + 1, dtype=np.int64)
+    np.cumsum(np.bincount(indices, minlength=n_pages), out=reverse_indptr[1:])
+    return reverse_indptr.astype(np.int32), sources[order]
+
+
+CSR_ARRAYS = ('indptr', 'indices', 'reverse_indptr', 'reverse_indices')
+
+
+def load_csr(links_path: str):
+    """
+    Returns the CSR arrays of an edge list and of its reversed links
+    (see CSR_ARRAYS), memory-mapped from the .npy files cached next to it.
+    The cache is built on the first load, and rebuilt whenever the edge
+    list is newer.
+    """
+    stem = os.path.splitext(links_path)[0]
+    paths = {name: f'{stem}.{name}.npy' for name in CSR_ARRAYS}
+
+    if not all(os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(links_path)
+               for path in paths.values()):
+        indptr, indices = build_csr(links_path)
+        arrays = dict(zip(CSR_ARRAYS, (indptr, indices, *transpose_csr(indptr, indices))))
+        for name, path in paths.items():
+            # Written under another name first, so that an interrupted build
+            # never leaves a truncated cache
+            with open(path + '.tmp', 'wb') as f:
+                np.save(f, arrays[name])
+            os.replace(path + '.tmp', path)
+
+    return tuple(np.load(paths[name], mmap_mode='r') for name in CSR_ARRAYS)
+
 
 class Wikigraph:
-    
-    def __init__(self):
-        links = open('data/enwiki-2013-small.txt').read().strip().split('\n')
-        self.hyperlinks = defaultdict(list)
-        for link in links:
-            a, b = [int(x) for x in link.split()]
-            self.hyperlinks[a].append(b)
+
+    def __init__(self, links_path: str = 'data/enwiki-2013-small.txt',
+                 names_path: str = 'data/enwiki-2013-small-names.csv'):
+        self.indptr, self.indices, self.reverse_indptr, self.reverse_indices = load_csr(links_path)
         
         self.name_to_id = defaultdict()
         self.id_to_name = defaultdict()
         
-        with open('data/enwiki-2013-small-names.csv') as f:
+        with open(names_path) as f:
             reader = csv.reader(f)
             for row in reader:
                 self.name_to_id[row[1]] = int(row[0])
@@ -30,42 +84,99 @@ class Wikigraph:
         return self.id_to_name[page_id]
     
     def get_links(self, page_id: int):
-        return self.hyperlinks[page_id]
+        if page_id + 1 >= len(self.indptr):
+            return self.indices[:0]
+        return self.indices[self.indptr[page_id]:self.indptr[page_id + 1]]
+    
+    def get_backlinks(self, page_id: int):
+        if page_id + 1 >= len(self.reverse_indptr):
+            return self.reverse_indices[:0]
+        return self.reverse_indices[self.reverse_indptr[page_id]:self.reverse_indptr[page_id + 1]]
+    
+    @property
+    def n_pages(self):
+        return max(len(self.indptr), len(self.reverse_indptr)) - 1
 
 
 
+def expand(indptr: np.ndarray, indices: np.ndarray, frontier: np.ndarray):
+    """
+    Links of a whole array of pages at once.
+
+    Returns
+    -------
+    links : np.ndarray
+        Target of each link.
+    parents : np.ndarray
+        Page of the frontier holding each link.
+    """
+    frontier = frontier[frontier + 1 < len(indptr)]
+    starts = indptr[frontier].astype(np.int64)
+    degrees = indptr[frontier + 1] - starts
+    parents = np.repeat(frontier, degrees)
+    # Position of each link in the indices array: the start of its page plus
+    # its rank among the links of the page
+    offsets = np.arange(len(parents)) - np.repeat(np.cumsum(degrees) - degrees, degrees)
+    return indices[np.repeat(starts, degrees) + offsets], parents
+
+
+def bidirectional_bfs(start_id: int, end_id: int, wikigraph: Wikigraph):
+    """
+    Breadth-first searches from `start_id` along the links and from `end_id`
+    along the backlinks, expanding one whole level of the smaller frontier
+    at a time. The first level reaching pages visited by the other search
+    contains a page of a shortest path, which is the one minimizing the
+    distance from the other side.
+
+    Returns the length of a shortest path and its page ids, or (math.inf, [])
+    if `end_id` cannot be reached.
+    """
+    if start_id == end_id:
+        return 0, [start_id]
+
+    n_pages = max(wikigraph.n_pages, start_id + 1, end_id + 1)
+    # Distance and parent of every page visited by each search (-1 if not visited)
+    sides = []
+    for page_id, indptr, indices in ((start_id, wikigraph.indptr, wikigraph.indices),
+                                     (end_id, wikigraph.reverse_indptr, wikigraph.reverse_indices)):
+        distance = np.full(n_pages, -1, dtype=np.int32)
+        parent = np.full(n_pages, -1, dtype=np.int32)
+        distance[page_id] = 0
+        sides.append([distance, parent, np.array([page_id], dtype=np.int32), indptr, indices])
+
+    while len(sides[0][2]) and len(sides[1][2]):
+        side, other = sides if len(sides[0][2]) <= len(sides[1][2]) else sides[::-1]
+        distance, parent, frontier, indptr, indices = side
+
+        links, parents = expand(indptr, indices, frontier)
+        new = distance[links] < 0
+        links, parents = links[new], parents[new]
+        parent[links] = parents
+        side[2] = np.unique(links)
+        distance[side[2]] = distance[frontier[0]] + 1
+
+        meetings = side[2][other[0][side[2]] >= 0]
+        if len(meetings):
+            meeting = int(meetings[np.argmin(other[0][meetings])])
+            halves = []
+            for distance, parent, *_ in sides:
+                half = [meeting]
+                while distance[half[-1]] > 0:
+                    half.append(int(parent[half[-1]]))
+                halves.append(half)
+            path = halves[0][::-1] + halves[1][1:]
+            return len(path) - 1, path
+
+    return math.inf, []
+
+
 def length_of_shortest_path(start_page: str, end_page: str, wikigraph: Wikigraph):
-    start_id = wikigraph.get_id(start_page)
-    end_id = wikigraph.get_id(end_page)
-    
+    """
+    Returns the number of links of a shortest path from `start_page` to
+    `end_page`, and the page ids along it.
+    """
+    return bidirectional_bfs(wikigraph.get_id(start_page), wikigraph.get_id(end_page), wikigraph)
 
-    visited = set()
-    depth = 2
-    length = math.inf
-    while length == math.inf:
-        depth += 1
-        length = recursive_search(start_id, end_id, visited, wikigraph, depth)[0]
-
-def recursive_search(start_id, end_id, visited, wikigraph, max_depth):
-    if max_depth == 0:
-        return (math.inf, [])
-
-    links_on_page = wikigraph.get_links(start_id)
-    for link in links_on_page:
-        # print(link)
-        if link == end_id:
-            print("Found path")
-            return (1, [end_id])
-
-        if link not in visited:
-            local_visited = deepcopy(visited)
-            local_visited.add(link)
-            previous = recursive_search(link, end_id, local_visited, wikigraph, max_depth - 1)
-
-            if previous[0] < math.inf:
-                return (previous[0] + 1, [link] + previous[1])
-    
-    return (math.inf, [])
 
 if __name__ == '__main__':
     wg = Wikigraph()
@@ -74,7 +185,8 @@ if __name__ == '__main__':
     end_page = "Solar power in Germany"
 
     start = time.time()
+    length, path = length_of_shortest_path(start_page, end_page, wg)
 
-    print(f"\nLength of shortest path: {length_of_shortest_path(start_page, end_page, wg)[0]}")
+    print(f"\nLength of shortest path: {length}")
+    print(" -> ".join(wg.id_to_name.get(page_id, str(page_id)) for page_id in path))
     print(f"Needed time: {time.time() - start}\n")
-